@@ -0,0 +1,92 @@
+"""
+Бенчмарк прямой синхронизации vault → iCloud.
+
+Сравнивает прежний shutil.copytree всего vault с VaultSync.mirror по
+манифесту: время прохода и объём скопированного при изменении k файлов.
+
+Запуск из корня репозитория:
+    python -m benchmarks.sync_bench
+    python -m benchmarks.sync_bench --files 10000 --tasks 500000 --changes 0,1,10,100
+"""
+
+import argparse
+import random
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.synthetic_vault import generate_vault
+from services.sync import VaultSync
+
+
+def _touch_files(paths, k: int, rnd: random.Random):
+    """Дописывает строку в k случайных файлов — как правка тикета."""
+    for fp in rnd.sample(paths, k):
+        with open(fp, "a", encoding="utf-8") as f:
+            f.write(f"- [ ] правка {rnd.random()}\n")
+
+
+def bench_sync(files: int, tasks: int, changes, repeats: int = 3):
+    with tempfile.TemporaryDirectory() as tmp:
+        synth = generate_vault(Path(tmp) / "vault", files=files, tasks=tasks)
+        paths = sorted(synth.root.rglob("*.md"))
+        total = sum(fp.stat().st_size for fp in paths)
+        print(f"Vault: {len(paths)} файлов, {total / 2**20:.1f} МБ")
+
+        t0 = time.perf_counter()
+        for _ in range(repeats):
+            shutil.copytree(synth.root, Path(tmp) / "copytree", dirs_exist_ok=True)
+        copytree = (time.perf_counter() - t0) / repeats
+        print(
+            f"copytree (любые изменения): {copytree * 1e3:.1f} мс, {total / 1024:.0f} КБ"
+        )
+
+        sync = VaultSync(
+            str(synth.root),
+            icloud_path=str(Path(tmp) / "icloud"),
+            manifest_path=str(Path(tmp) / "manifest.json"),
+        )
+        t0 = time.perf_counter()
+        st = sync.mirror()
+        print(
+            f"mirror, первый проход: {(time.perf_counter() - t0) * 1e3:.1f} мс, "
+            f"{st.copied_bytes / 1024:.0f} КБ"
+        )
+
+        print(
+            f"{'изменено файлов':>15} | {'mirror, мс':>10} | {'хэшей':>6} | "
+            f"{'скопировано, КБ':>15} | {'vs copytree':>11}"
+        )
+        rnd = random.Random(0)
+        for k in changes:
+            best, st = None, None
+            for _ in range(repeats):
+                _touch_files(paths, k, rnd)
+                t0 = time.perf_counter()
+                st = sync.mirror()
+                dt = time.perf_counter() - t0
+                best = dt if best is None else min(best, dt)
+            print(
+                f"{k:>15} | {best * 1e3:>10.1f} | {st.hashed:>6} | "
+                f"{st.copied_bytes / 1024:>15.1f} | {copytree / best:>10.1f}x"
+            )
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--files", type=int, default=1000)
+    ap.add_argument("--tasks", type=int, default=100_000)
+    ap.add_argument("--changes", default="0,1,10,100")
+    ap.add_argument("--repeats", type=int, default=3)
+    args = ap.parse_args()
+    bench_sync(
+        args.files,
+        args.tasks,
+        [int(x) for x in args.changes.split(",")],
+        args.repeats,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Генератор синтетического vault для бенчмарков.
+
+Создаёт <root>/Входящие/ с дневными файлами в том же формате, что пишет бот:
+строка задачи Obsidian Tasks + строка %%id:…%% с метаданными, вперемешку
+с заголовками, заметками и чекбоксами без меты.
+"""
+
+import random
+from dataclasses import dataclass
+from datetime import date, timedelta
+from pathlib import Path
+from typing import List
+
+_PRIORITIES = ["medium"] * 5 + ["high"] * 2 + ["low", "critical"]
+_WORDS = (
+    "подготовить ревью отчёт встреча план релиз архитектура найм бюджет "
+    "roadmap onboarding incident postmortem метрики OKR 1:1 демо миграция"
+).split()
+_STRAY = [
+    "## Заметки",
+    "- просто пункт списка без чекбокса",
+    "- [ ] чекбокс без метаданных",
+    "Обсудили с командой, решили вернуться позже.",
+    "",
+]
+
+
+@dataclass
+class SyntheticVault:
+    root: Path
+    files: int
+    tasks: int
+    active_ids: List[str]
+    done_ids: List[str]
+
+
+def generate_vault(
+    root: Path,
+    files: int = 1000,
+    tasks: int = 10000,
+    done_ratio: float = 0.7,
+    stray_ratio: float = 0.2,
+    inbox_dir: str = "Входящие",
+    seed: int = 42,
+) -> SyntheticVault:
+    """
+    Раскладывает tasks задач по files дневным файлам, заканчивающимся сегодня.
+    Дедлайны разбросаны вокруг даты файла, у закрытых задач есть ✅.
+    """
+    rnd = random.Random(seed)
+    inbox = Path(root) / inbox_dir
+    inbox.mkdir(parents=True, exist_ok=True)
+
+    today = date.today()
+    per_file, extra = divmod(tasks, files)
+    active_ids: List[str] = []
+    done_ids: List[str] = []
+
+    for f in range(files):
+        day = today - timedelta(days=files - 1 - f)
+        rows = [f"# {day.isoformat()}", ""]
+        for k in range(per_file + (1 if f < extra else 0)):
+            if rnd.random() < stray_ratio:
+                rows.append(rnd.choice(_STRAY))
+
+            tid = f"T-{day.strftime('%y%m%d')}-{k:04x}"
+            # недавние задачи чаще открыты — как в живом vault
+            done = rnd.random() < done_ratio * min(1.0, (files - f) / 30)
+            title = " ".join(rnd.choices(_WORDS, k=rnd.randint(2, 6)))
+
+            line = f"- [{'x' if done else ' '}] {title}"
+            if rnd.random() < 0.85:
+                due = day + timedelta(days=rnd.randint(0, 21))
+                line += f" 📅 {due.isoformat()}"
+            if done:
+                line += f" ✅ {(day + timedelta(days=rnd.randint(0, 7))).isoformat()}"
+
+            priority = rnd.choice(_PRIORITIES)
+            meta = f"id:{tid}" + (f" p:{priority}" if priority != "medium" else "")
+            rows += [line, f"%%{meta}%%"]
+            (done_ids if done else active_ids).append(tid)
+
+        path = inbox / f"{day.isoformat()}.md"
+        path.write_text("\n".join(rows) + "\n", encoding="utf-8")
+
+    return SyntheticVault(Path(root), files, tasks, active_ids, done_ids)
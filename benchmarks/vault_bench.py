@@ -0,0 +1,259 @@
+"""
+Бенчмарки ObsidianVault.
+
+Запуск из корня репозитория:
+    python -m benchmarks.vault_bench                       # набор операций, preset small
+    python -m benchmarks.vault_bench suite --preset large --backend sqlite
+    python -m benchmarks.vault_bench suite --max-p99-ms 50  # код 1 при регрессии
+    python -m benchmarks.vault_bench growth                # create_ticket vs размер файла
+    python -m benchmarks.vault_bench parse --preset large  # разбор: мкс и байт на тикет
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date
+from pathlib import Path
+from typing import Callable, List, Optional
+
+from benchmarks.synthetic_vault import generate_vault
+from services.obsidian import ObsidianVault, Ticket
+
+PRESETS = {
+    "small": (1_000, 10_000),
+    "medium": (1_000, 100_000),
+    "large": (10_000, 500_000),
+}
+
+
+def _fill_daily(vault: ObsidianVault, n: int):
+    """Заполняет сегодняшний дневной файл n тикетами напрямую, минуя vault."""
+    today = date.today().isoformat()
+    rows = []
+    for i in range(n):
+        t = Ticket(id=f"T-000000-{i:04x}", title=f"Задача {i}", due_date=today)
+        rows.append(t.to_task_line())
+        rows.append(t.to_meta_line())
+    vault._daily_path().write_text("\n".join(rows) + "\n", encoding="utf-8")
+
+
+def bench_create_growth(sizes, repeats: int = 200):
+    """Латентность create_ticket в зависимости от размера дневного файла."""
+    print(
+        f"{'тикетов в файле':>16} | {'размер, КБ':>10} | {'p50, мкс':>9} | {'p99, мкс':>9}"
+    )
+    for n in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            vault = ObsidianVault(tmp)
+            _fill_daily(vault, n)
+            vault.get_all_tickets()  # прогреваем индекс
+
+            samples = []
+            for i in range(repeats):
+                t0 = time.perf_counter()
+                vault.create_ticket(f"Новая задача {i}")
+                samples.append((time.perf_counter() - t0) * 1e6)
+
+            size_kb = vault._daily_path().stat().st_size / 1024
+            samples.sort()
+            p50 = statistics.median(samples)
+            p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+            print(f"{n:>16} | {size_kb:>10.0f} | {p50:>9.0f} | {p99:>9.0f}")
+
+
+def _percentile(sorted_samples: List[float], q: float) -> float:
+    return sorted_samples[min(len(sorted_samples) - 1, int(len(sorted_samples) * q))]
+
+
+def _time(fn: Callable[[], object], repeats: int) -> List[float]:
+    samples = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return sorted(samples)
+
+
+def _peak_mb(fn: Callable[[], object]) -> float:
+    """Пик аллокаций Python за один вызов (tracemalloc замедляет, поэтому отдельно)."""
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1] / 2**20
+    finally:
+        tracemalloc.stop()
+
+
+def bench_suite(
+    files: int,
+    tasks: int,
+    repeats: int,
+    backend: str = "memory",
+    max_p99_ms: Optional[float] = None,
+) -> bool:
+    """Основные операции vault на синтетическом vault. False — если превышен p99."""
+    with tempfile.TemporaryDirectory() as tmp:
+        t0 = time.perf_counter()
+        synth = generate_vault(Path(tmp) / "vault", files=files, tasks=tasks)
+        print(
+            f"Vault: {files} файлов, {tasks} задач "
+            f"(активных {len(synth.active_ids)}), backend={backend}, "
+            f"сгенерирован за {time.perf_counter() - t0:.1f} с"
+        )
+
+        def open_vault(cold: bool) -> ObsidianVault:
+            db = None
+            if backend == "sqlite":
+                db = os.path.join(tmp, "cold.sqlite3" if cold else "index.sqlite3")
+                for suffix in ("", "-wal", "-shm"):
+                    if cold and os.path.exists(db + suffix):
+                        os.remove(db + suffix)
+            # rescan_interval=0: каждый запрос сверяет индекс с диском (худший случай)
+            return ObsidianVault(str(synth.root), rescan_interval=0, index_db=db)
+
+        vault = open_vault(cold=True)
+        vault._scan_all()
+
+        rnd = random.Random(0)
+        active, done = list(synth.active_ids), list(synth.done_ids)
+        rnd.shuffle(active)
+        rnd.shuffle(done)
+        slow_repeats = max(1, min(repeats, 5))
+        today = date.today().isoformat()
+
+        ops = [
+            (
+                "_scan_all (холодный)",
+                lambda: open_vault(True)._scan_all(),
+                slow_repeats,
+            ),
+            ("_scan_all (тёплый)", vault._scan_all, repeats),
+            ("get_today_tickets", vault.get_today_tickets, repeats),
+            (
+                "iter_tickets (overdue)",
+                lambda: sum(1 for _ in vault.iter_tickets("todo", due_to=today)),
+                repeats,
+            ),
+            (
+                "search_tickets",
+                lambda: vault.search_tickets("ревью отч"),
+                repeats,
+            ),
+            ("create_ticket", lambda: vault.create_ticket("Бенчмарк"), repeats),
+            (
+                "update_status",
+                lambda: vault.update_status(active.pop(), "done"),
+                min(repeats, len(active) // 2),
+            ),
+            (
+                "delete_ticket",
+                lambda: vault.delete_ticket(done.pop()),
+                min(repeats, len(done) // 2),
+            ),
+        ]
+
+        print(
+            f"{'операция':<22} | {'n':>5} | {'ops/s':>9} | "
+            f"{'p50, мс':>9} | {'p99, мс':>9} | {'пик, МБ':>8}"
+        )
+        ok = True
+        for name, fn, n in ops:
+            if n <= 0:
+                continue
+            samples = _time(fn, n)
+            peak = _peak_mb(fn)
+            p50 = statistics.median(samples) * 1e3
+            p99 = _percentile(samples, 0.99) * 1e3
+            print(
+                f"{name:<22} | {n:>5} | {n / sum(samples):>9.1f} | "
+                f"{p50:>9.2f} | {p99:>9.2f} | {peak:>8.1f}"
+            )
+            if max_p99_ms is not None and p99 > max_p99_ms and "холодный" not in name:
+                print(f"  ⚠️ p99 {p99:.2f} мс > {max_p99_ms} мс")
+                ok = False
+        return ok
+
+
+def bench_parse(files: int, tasks: int, repeats: int = 3):
+    """Разбор дневных файлов: время и удерживаемая память на один тикет."""
+    with tempfile.TemporaryDirectory() as tmp:
+        synth = generate_vault(Path(tmp) / "vault", files=files, tasks=tasks)
+        vault = ObsidianVault(str(synth.root))
+        paths = sorted(vault.inbox_path.glob("*.md"))
+
+        def parse_all():
+            return [vault._parse_file(fp)[0] for fp in paths]
+
+        parse_all()  # прогреваем page cache
+        best = min(_time(parse_all, repeats))
+
+        tracemalloc.start()
+        parsed = parse_all()
+        retained = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        n = sum(len(ts) for ts in parsed)
+        print(
+            f"Разобрано {n} тикетов из {len(paths)} файлов: "
+            f"{best * 1e6 / n:.2f} мкс/тикет, {retained / n:.0f} Б/тикет в памяти"
+        )
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__)
+    sub = ap.add_subparsers(dest="cmd")
+
+    suite = sub.add_parser("suite", help="основные операции на синтетическом vault")
+    suite.add_argument("--preset", choices=sorted(PRESETS), default="small")
+    suite.add_argument("--files", type=int, help="переопределить число файлов")
+    suite.add_argument("--tasks", type=int, help="переопределить число задач")
+    suite.add_argument("--backend", choices=["memory", "sqlite"], default="memory")
+    suite.add_argument("--repeats", type=int, default=200)
+    suite.add_argument(
+        "--max-p99-ms",
+        type=float,
+        help="завершиться с кодом 1, если p99 тёплой операции выше порога",
+    )
+
+    growth = sub.add_parser("growth", help="create_ticket vs размер дневного файла")
+    growth.add_argument(
+        "--sizes",
+        default="0,1000,10000,50000",
+        help="размеры дневного файла (в тикетах) через запятую",
+    )
+    growth.add_argument("--repeats", type=int, default=200)
+
+    parse = sub.add_parser("parse", help="время и память разбора на тикет")
+    parse.add_argument("--preset", choices=sorted(PRESETS), default="medium")
+    parse.add_argument("--repeats", type=int, default=3)
+
+    args = ap.parse_args()
+
+    if args.cmd == "growth":
+        bench_create_growth([int(x) for x in args.sizes.split(",")], args.repeats)
+        return
+
+    if args.cmd == "parse":
+        bench_parse(*PRESETS[args.preset], repeats=args.repeats)
+        return
+
+    if args.cmd is None:
+        args = suite.parse_args([])
+    files, tasks = PRESETS[args.preset]
+    ok = bench_suite(
+        args.files or files,
+        args.tasks or tasks,
+        args.repeats,
+        backend=args.backend,
+        max_p99_ms=args.max_p99_ms,
+    )
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
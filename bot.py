@@ -5,7 +5,13 @@ import logging
 import re
 import sys
 
-from telegram.ext import Application, CommandHandler, MessageHandler, filters
+from telegram.ext import (
+    Application,
+    CallbackQueryHandler,
+    CommandHandler,
+    MessageHandler,
+    filters,
+)
 
 from config import Config
 from handlers.articles import article_command
@@ -15,6 +21,8 @@ from handlers.common import (
     handle_message,
     help_command,
     model_command,
+    setup_conversations,
+    shutdown_conversations,
     start,
     stats_command,
 )
@@ -22,10 +30,16 @@ from handlers.reminders import remind_command, setup_reminder
 from handlers.tickets import (  # ← убран progress_command
     delete_ticket_command,
     done_command,
+    find_command,
+    reschedule_command,
+    setup_archive,
+    setup_sync,
     sync_command,
     ticket_command,
     tickets_command,
+    tickets_page_callback,
     today_command,
+    week_command,
 )
 
 # ── Логирование ──
@@ -78,7 +92,12 @@ def main():
     )
     logger.info("Vault: %s", config.OBSIDIAN_VAULT_PATH)
 
-    app = Application.builder().token(config.TELEGRAM_TOKEN).build()
+    app = (
+        Application.builder()
+        .token(config.TELEGRAM_TOKEN)
+        .post_shutdown(shutdown_conversations)
+        .build()
+    )
 
     # ── Команды: общие ──
     app.add_handler(CommandHandler("start", start))
@@ -90,10 +109,14 @@ def main():
     # ── Команды: тикеты ──
     app.add_handler(CommandHandler("ticket", ticket_command))
     app.add_handler(CommandHandler("tickets", tickets_command))
+    app.add_handler(CallbackQueryHandler(tickets_page_callback, pattern=r"^tickets:"))
     app.add_handler(CommandHandler("today", today_command))
+    app.add_handler(CommandHandler("week", week_command))
+    app.add_handler(CommandHandler("find", find_command))
     app.add_handler(CommandHandler("done", done_command))
     # progress убран — в формате Tasks нет промежуточного статуса
     app.add_handler(CommandHandler("delete_ticket", delete_ticket_command))
+    app.add_handler(CommandHandler("reschedule", reschedule_command))
     app.add_handler(CommandHandler("sync", sync_command))
 
     # ── Команды: статьи и книги ──
@@ -109,6 +132,15 @@ def main():
     # ── Утреннее напоминание ──
     setup_reminder(app.job_queue)
 
+    # ── Запись диалогов на диск ──
+    setup_conversations(app.job_queue)
+
+    # ── Архивация закрытых тикетов ──
+    setup_archive(app.job_queue)
+
+    # ── Периодическая полная синхронизация ──
+    setup_sync(app.job_queue)
+
     logger.info("✅ Бот запущен!")
     app.run_polling()
 
@@ -42,13 +42,34 @@ class Config:
     LLM_MODEL: str = os.getenv("LLM_MODEL", "openai/gpt-4o")
     OPENROUTER_APP_NAME: str = os.getenv("OPENROUTER_APP_NAME", "MyTelegramBot")
     OPENROUTER_SITE_URL: str = os.getenv("OPENROUTER_SITE_URL", "")
+    # Одновременных запросов к OpenRouter; остальные ждут в очереди
+    LLM_MAX_CONCURRENCY: int = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+    # Повторов при 429/5xx/обрыве связи
+    LLM_MAX_RETRIES: int = int(os.getenv("LLM_MAX_RETRIES", "3"))
+    # Ответ приходит по кускам и дописывается в сообщение по мере генерации
+    LLM_STREAMING: bool = os.getenv("LLM_STREAMING", "true").lower() == "true"
+    # Telegram ограничивает частоту правок — не чаще раза в N секунд
+    STREAM_EDIT_INTERVAL: float = float(os.getenv("STREAM_EDIT_INTERVAL", "1.5"))
 
     # ── История диалога ──
-    MAX_HISTORY: int = int(os.getenv("MAX_HISTORY", "20"))
+    # Сколько токенов истории уходит в промт; что старше — сворачивается в конспект
+    HISTORY_TOKEN_BUDGET: int = int(os.getenv("HISTORY_TOKEN_BUDGET", "3000"))
+    # Диалоги переживают рестарт в SQLite; пусто — только в памяти
+    CONVERSATION_DB: str = os.getenv("CONVERSATION_DB", "./data/conversations.sqlite3")
+    # Сколько диалогов держать в памяти; остальные — на диске
+    CONVERSATION_MAX_HOT: int = int(os.getenv("CONVERSATION_MAX_HOT", "100"))
+    # Диалог без сообщений дольше N дней забывается
+    CONVERSATION_TTL_DAYS: float = float(os.getenv("CONVERSATION_TTL_DAYS", "30"))
+    # Как часто изменённые диалоги сбрасываются на диск
+    CONVERSATION_FLUSH_SECONDS: float = float(
+        os.getenv("CONVERSATION_FLUSH_SECONDS", "30")
+    )
 
     # ── Obsidian ──
     OBSIDIAN_VAULT_PATH: str = os.getenv("OBSIDIAN_VAULT_PATH", "./vault")
     OBSIDIAN_TICKETS_DIR: str = os.getenv("OBSIDIAN_TICKETS_DIR", "tickets")
+    # Путь к SQLite-зеркалу индекса тикетов; пусто — индекс только в памяти
+    OBSIDIAN_INDEX_DB: str = os.getenv("OBSIDIAN_INDEX_DB", "")
 
     # ── iCloud / Sync ──
     ICLOUD_SYNC_ENABLED: bool = (
@@ -56,6 +77,16 @@ class Config:
     )
     ICLOUD_VAULT_PATH: str = os.getenv("ICLOUD_VAULT_PATH", "")
     RCLONE_REMOTE: str = os.getenv("RCLONE_REMOTE", "")
+    # Записи склеиваются в одну синхронизацию: ждём N секунд тишины,
+    # но не дольше MAX_DELAY от первой несинхронизированной записи
+    SYNC_DEBOUNCE_SECONDS: float = float(os.getenv("SYNC_DEBOUNCE_SECONDS", "5"))
+    SYNC_MAX_DELAY_SECONDS: float = float(os.getenv("SYNC_MAX_DELAY_SECONDS", "60"))
+    # Манифест прямой синхронизации в iCloud: копируются только изменённые файлы
+    SYNC_MANIFEST_PATH: str = os.getenv(
+        "SYNC_MANIFEST_PATH", "./data/sync_manifest.json"
+    )
+    # Бот отправляет только свои файлы; полный проход (правки из Obsidian) — раз в N минут
+    SYNC_FULL_INTERVAL_MINUTES: int = int(os.getenv("SYNC_FULL_INTERVAL_MINUTES", "30"))
 
     # ── Напоминания ──
     REMINDER_ENABLED: bool = os.getenv("REMINDER_ENABLED", "true").lower() == "true"
@@ -63,5 +94,32 @@ class Config:
     REMINDER_MINUTE: int = int(os.getenv("REMINDER_MINUTE", "0"))
     TIMEZONE: str = os.getenv("TIMEZONE", "Europe/Moscow")
 
+    # ── Архив тикетов ──
+    # Закрытые тикеты старше N дней уезжают в месячные заметки архива (0 — выкл.)
+    ARCHIVE_AFTER_DAYS: int = int(os.getenv("ARCHIVE_AFTER_DAYS", "30"))
+    ARCHIVE_HOUR: int = int(os.getenv("ARCHIVE_HOUR", "4"))
+
+    # ── Книги ──
+    # Кэш оценок книг; пусто — только в памяти
+    BOOK_CACHE_DB: str = os.getenv("BOOK_CACHE_DB", "./data/book_cache.sqlite3")
+    # Насколько похожим (0..1, по триграммам) должно быть название для ответа из кэша
+    BOOK_CACHE_MIN_SIMILARITY: float = float(
+        os.getenv("BOOK_CACHE_MIN_SIMILARITY", "0.9")
+    )
+
     # ── Парсинг статей ──
+    # Статья длиннее — читается по частям: конспект каждой, затем общий разбор
     ARTICLE_MAX_CHARS: int = int(os.getenv("ARTICLE_MAX_CHARS", "15000"))
+    ARTICLE_CHUNK_CHARS: int = int(os.getenv("ARTICLE_CHUNK_CHARS", "12000"))
+    # Больше частей не читаем — хвост очень длинных текстов отбрасывается
+    ARTICLE_MAX_CHUNKS: int = int(os.getenv("ARTICLE_MAX_CHUNKS", "12"))
+    # Кэш саммари; пусто — только в памяти
+    ARTICLE_CACHE_DB: str = os.getenv(
+        "ARTICLE_CACHE_DB", "./data/article_cache.sqlite3"
+    )
+    ARTICLE_CACHE_MAX_MB: float = float(os.getenv("ARTICLE_CACHE_MAX_MB", "50"))
+    ARTICLE_CACHE_TTL_DAYS: float = float(os.getenv("ARTICLE_CACHE_TTL_DAYS", "30"))
+    # Столько часов повторная ссылка отвечается без скачивания статьи
+    ARTICLE_CACHE_URL_TTL_HOURS: float = float(
+        os.getenv("ARTICLE_CACHE_URL_TTL_HOURS", "24")
+    )
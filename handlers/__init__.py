@@ -1,16 +1,41 @@
 from config import Config
+from services.article_cache import ArticleCache
 from services.article_parser import ArticleParser
-from services.obsidian import ObsidianVault
-from services.sync import VaultSync
+from services.book_cache import BookCache
+from services.obsidian import AsyncObsidianVault, ObsidianVault
+from services.sync import SyncScheduler, VaultSync
 
 from .llm_handler import LLMHandler
 
 config = Config()
 llm_handler = LLMHandler()
-vault = ObsidianVault(config.OBSIDIAN_VAULT_PATH, inbox_dir="Входящие")
+vault = AsyncObsidianVault(
+    ObsidianVault(
+        config.OBSIDIAN_VAULT_PATH,
+        inbox_dir="Входящие",
+        index_db=config.OBSIDIAN_INDEX_DB or None,
+    )
+)
 vault_sync = VaultSync(
     config.OBSIDIAN_VAULT_PATH,
     config.ICLOUD_VAULT_PATH,
     config.RCLONE_REMOTE,
+    manifest_path=config.SYNC_MANIFEST_PATH,
+)
+sync_scheduler = SyncScheduler(
+    vault_sync,
+    quiet=config.SYNC_DEBOUNCE_SECONDS,
+    max_delay=config.SYNC_MAX_DELAY_SECONDS,
 )
 article_parser = ArticleParser()
+article_cache = ArticleCache(
+    config.ARTICLE_CACHE_DB,
+    max_bytes=int(config.ARTICLE_CACHE_MAX_MB * 2**20),
+    ttl=config.ARTICLE_CACHE_TTL_DAYS * 86400,
+    url_ttl=config.ARTICLE_CACHE_URL_TTL_HOURS * 3600,
+)
+book_cache = BookCache(
+    config.BOOK_CACHE_DB,
+    version=llm_handler.book_cache_version(),
+    threshold=config.BOOK_CACHE_MIN_SIMILARITY,
+)
@@ -5,8 +5,9 @@ from typing import Optional
 from telegram import Update, constants
 from telegram.ext import ContextTypes
 
-from . import article_parser, llm_handler
-from .common import send_long_message
+from . import article_cache, article_parser, config, llm_handler
+from .common import QueueNotice, send_long_message, stream_long_message
+from .llm_handler import Caller, Priority
 
 logger = logging.getLogger(__name__)
 
@@ -44,7 +45,22 @@ async def article_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await _process_article(update, url)
 
 
+def _article_header(title: str, language: str, word_count: int) -> str:
+    lang_label = "🇷🇺 Русский" if language == "ru" else "🇬🇧 Английский"
+    return f"📄 **{title}**\n🌐 Язык: {lang_label}\n📏 ~{word_count} слов"
+
+
 async def _process_article(update: Update, url: str):
+    cached = await article_cache.lookup_url(url)
+    if cached:
+        await update.message.reply_text(
+            _article_header(cached.title, cached.language, cached.word_count)
+            + "\n\n⚡ Из кэша",
+            parse_mode="Markdown",
+        )
+        await send_long_message(update.message, cached.summary, parse_mode="Markdown")
+        return
+
     await update.message.reply_text(
         f"📰 Анализирую статью...\n`{url}`", parse_mode="Markdown"
     )
@@ -59,25 +75,39 @@ async def _process_article(update: Update, url: str):
         )
         return
 
-    lang_label = "🇷🇺 Русский" if article.language == "ru" else "🇬🇧 Английский"
-    await update.message.reply_text(
-        f"📄 **{article.title}**\n"
-        f"🌐 Язык: {lang_label}\n"
-        f"📏 ~{article.word_count} слов\n\n"
-        f"🤖 Анализирую содержание...",
-        parse_mode="Markdown",
-    )
+    header = _article_header(article.title, article.language, article.word_count)
+    # та же статья по другой ссылке или не изменившаяся с прошлого раза
+    key = llm_handler.article_cache_key(article.text)
+    summary = await article_cache.get(key)
+    if summary:
+        await article_cache.put(url, article, key)
+        await update.message.reply_text(
+            f"{header}\n\n⚡ Из кэша", parse_mode="Markdown"
+        )
+        await send_long_message(update.message, summary, parse_mode="Markdown")
+        return
+
+    status = "🤖 Анализирую содержание..."
+    if len(article.text) > config.ARTICLE_MAX_CHARS:
+        status = "🤖 Статья длинная — читаю по частям, затем соберу разбор..."
+    await update.message.reply_text(f"{header}\n\n{status}", parse_mode="Markdown")
 
     await update.message.chat.send_action(action=constants.ChatAction.TYPING)
 
-    result = await llm_handler.summarize_article(
+    done = []
+    result = llm_handler.stream_article_summary(
         text=article.text,
         title=article.title,
         language=article.language,
         url=url,
+        on_complete=done.append,
+        caller=Caller(
+            update.effective_user.id, Priority.BATCH, QueueNotice(update.message)
+        ),
     )
-
-    await send_long_message(update.message, result, parse_mode="Markdown")
+    await stream_long_message(update.message, result, parse_mode="Markdown")
+    if done:
+        await article_cache.put(url, article, key, done[0])
 
 
 async def handle_url_message(update: Update, message_text: str) -> bool:
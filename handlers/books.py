@@ -3,26 +3,33 @@ import logging
 from telegram import Update
 from telegram.ext import ContextTypes
 
-from . import llm_handler
-from .common import send_long_message
+from . import book_cache, llm_handler
+from .common import QueueNotice, send_long_message, stream_long_message
+from .llm_handler import Caller, Priority
 
 logger = logging.getLogger(__name__)
 
+_REFRESH_FLAGS = {"-f", "--refresh"}
+
 
 async def book_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
     /book <название книги> [автор]
     /book Accelerate by Nicole Forsgren
     /book Карьера менеджера — Гроув
+    /book -f Accelerate — заново, мимо кэша
     """
-    book_info = " ".join(context.args) if context.args else ""
+    args = context.args or []
+    refresh = any(a in _REFRESH_FLAGS for a in args)
+    book_info = " ".join(a for a in args if a not in _REFRESH_FLAGS)
     if not book_info:
         await update.message.reply_text(
             "📚 **Оценка книг для пути TL → CTO**\n\n"
             "Использование:\n"
             "• `/book Accelerate by Nicole Forsgren`\n"
             "• `/book Карьера менеджера — Эндрю Гроув`\n"
-            "• `/book The Manager's Path`\n\n"
+            "• `/book The Manager's Path`\n"
+            "• `/book -f Accelerate` — оценить заново, не из кэша\n\n"
             "Бот оценит книгу по:\n"
             "• Полезности для роста TL → CTO (1-10)\n"
             "• Ключевым идеям\n"
@@ -32,6 +39,16 @@ async def book_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
         return
 
+    match = None if refresh else book_cache.lookup(book_info)
+    if match:
+        await update.message.reply_text(
+            f"⚡ Из кэша: *{match.query}* ({match.score:.0%})\n"
+            f"Не та книга или нужна свежая оценка — `/book -f {book_info}`",
+            parse_mode="Markdown",
+        )
+        await send_long_message(update.message, match.evaluation, parse_mode="Markdown")
+        return
+
     await update.message.reply_text(
         f"📚 Оцениваю книгу: *{book_info}*...", parse_mode="Markdown"
     )
@@ -40,5 +57,13 @@ async def book_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     await update.message.chat.send_action(action=constants.ChatAction.TYPING)
 
-    result = await llm_handler.evaluate_book(book_info)
-    await send_long_message(update.message, result, parse_mode="Markdown")
+    done = []
+    caller = Caller(
+        update.effective_user.id, Priority.BATCH, QueueNotice(update.message)
+    )
+    result = llm_handler.stream_book_evaluation(
+        book_info, on_complete=done.append, caller=caller
+    )
+    await stream_long_message(update.message, result, parse_mode="Markdown")
+    if done:
+        await book_cache.put(book_info, done[0])
@@ -1,10 +1,14 @@
+import asyncio
 import logging
 import re
+import time
+from typing import AsyncIterator
 
 from telegram import Update
+from telegram.error import BadRequest, RetryAfter, TelegramError
 from telegram.ext import ContextTypes
 
-from . import llm_handler
+from . import config, llm_handler
 
 logger = logging.getLogger(__name__)
 
@@ -48,6 +52,159 @@ async def send_long_message(message, text: str, parse_mode: str = None):
             await message.reply_text(chunk)
 
 
+def _split_point(text: str, limit: int = 4096) -> int:
+    """Где резать длинный ответ: по переносу строки, если он не слишком рано."""
+    cut = text.rfind("\n", 0, limit)
+    return cut + 1 if cut > limit // 2 else limit
+
+
+class _StreamingReply:
+    """
+    Ответ, который дописывается по мере генерации. Первое сообщение уходит
+    с первыми токенами, дальше правится не чаще раза в interval секунд.
+    Дойдя до лимита Telegram, сообщение закрывается и ответ идёт в новом.
+    Промежуточные правки — без разметки (незакрытый ** её ломает),
+    разметка применяется к законченному сообщению.
+    """
+
+    MAX_LEN = 4096
+
+    def __init__(self, message, parse_mode: str = None, interval: float = 1.5):
+        self.message = message
+        self.parse_mode = parse_mode
+        self.interval = interval
+        self.text = ""  # текст текущего сообщения
+        self.sent = None  # текущее сообщение в Telegram
+        self.shown = ""  # что в нём сейчас видно
+        self.next_edit = 0.0
+
+    async def feed(self, piece: str):
+        self.text += piece
+        while len(self.text) > self.MAX_LEN:
+            cut = _split_point(self.text, self.MAX_LEN)
+            head, self.text = self.text[:cut], self.text[cut:]
+            await self._finish(head)
+        if self.text.strip() and time.monotonic() >= self.next_edit:
+            await self._show()
+
+    async def close(self):
+        if self.text.strip():
+            await self._finish(self.text)
+        self.text = ""
+
+    async def _put(self, text: str, parse_mode: str = None):
+        if self.sent is None:
+            self.sent = await self.message.reply_text(text, parse_mode=parse_mode)
+        else:
+            await self.sent.edit_text(text, parse_mode=parse_mode)
+
+    async def _show(self):
+        if self.text == self.shown:
+            return
+        try:
+            await self._put(self.text)
+            self.shown = self.text
+        except RetryAfter as e:
+            # флуд-контроль: пропускаем правки, пока Telegram не разрешит
+            self.next_edit = time.monotonic() + e.retry_after
+            return
+        except BadRequest as e:
+            logger.warning("Stream edit failed: %s", e)
+        self.next_edit = time.monotonic() + self.interval
+
+    async def _finish(self, text: str):
+        """Окончательный вид сообщения: с разметкой, если она разбирается."""
+        try:
+            try:
+                await self._put(text, self.parse_mode)
+            except RetryAfter as e:
+                await asyncio.sleep(e.retry_after)
+                await self._put(text, self.parse_mode)
+        except BadRequest:
+            # разметка не разобралась — или без неё текст уже показан
+            if text != self.shown:
+                await self._put(text)
+        self.sent, self.shown = None, ""
+
+
+class QueueNotice:
+    """
+    on_queue для запроса к LLM: сообщение «в очереди» появляется, только
+    если запрос ждёт, обновляет позицию и удаляется, когда запрос пошёл.
+    """
+
+    def __init__(self, message, interval: float = 2.0):
+        self.message = message
+        self.interval = interval
+        self._sent = None
+        self._closed = False
+        self._next_edit = 0.0
+        self._lock = asyncio.Lock()
+        self._tasks = set()
+
+    def __call__(self, position: int):
+        # планировщик вызывает синхронно — Telegram трогаем в отдельной задаче
+        task = asyncio.get_running_loop().create_task(self._update(position))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _update(self, position: int):
+        async with self._lock:
+            if self._closed:
+                return
+            try:
+                if position == 0:
+                    self._closed = True
+                    if self._sent:
+                        await self._sent.delete()
+                    return
+                text = f"⏳ Запрос в очереди, позиция: {position}"
+                if self._sent is None:
+                    self._sent = await self.message.reply_text(text)
+                elif time.monotonic() >= self._next_edit:
+                    await self._sent.edit_text(text)
+                else:
+                    return
+                self._next_edit = time.monotonic() + self.interval
+            except TelegramError as e:
+                logger.warning("Queue notice failed: %s", e)
+
+
+async def stream_long_message(
+    message, chunks: AsyncIterator[str], parse_mode: str = None
+):
+    """Как send_long_message, но для ответа, который ещё генерируется."""
+    reply = _StreamingReply(message, parse_mode, config.STREAM_EDIT_INTERVAL)
+    try:
+        async for piece in chunks:
+            await reply.feed(piece)
+    finally:
+        # даже если генерация оборвалась, показываем полученное
+        await reply.close()
+
+
+async def flush_conversations_job(context: ContextTypes.DEFAULT_TYPE):
+    try:
+        await llm_handler.conversations.flush()
+    except Exception:
+        logger.exception("Conversation flush failed")
+
+
+def setup_conversations(job_queue):
+    """Изменённые диалоги сбрасываются на диск пачкой раз в N секунд."""
+    job_queue.run_repeating(
+        flush_conversations_job,
+        interval=config.CONVERSATION_FLUSH_SECONDS,
+        first=config.CONVERSATION_FLUSH_SECONDS,
+        name="flush_conversations",
+    )
+
+
+async def shutdown_conversations(app):
+    # то, что не успел записать периодический flush
+    await llm_handler.conversations.flush()
+
+
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
     await update.message.reply_text(
@@ -74,16 +231,20 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "**📋 Тикеты (Obsidian):**\n"
         "`/ticket Заголовок задачи` — создать тикет\n"
         "`/ticket Задача -p high -d tomorrow` — с приоритетом и дедлайном\n"
-        "/tickets — список активных тикетов\n"
+        "`/tickets [all|done]` — тикеты постранично, листаются кнопками\n"
         "/today — задачи на сегодня\n"
-        "`/done T-XXXX` — завершить тикет\n"
+        "/week — задачи на ближайшую неделю\n"
+        "`/find слова` — поиск по тикетам\n"
+        "`/done T-XXXX [T-YYYY ...]` — завершить тикеты\n"
         "`/progress T-XXXX` — отметить «в работе»\n"
-        "`/delete_ticket T-XXXX` — удалить тикет\n\n"
+        "`/delete_ticket T-XXXX [T-YYYY ...]` — удалить тикеты\n"
+        "`/reschedule tomorrow T-XXXX [T-YYYY ...]` — перенести дедлайн\n\n"
         "**📰 Статьи:**\n"
         "`/article URL` — анализ статьи\n"
         "или просто отправьте ссылку\n\n"
         "**📚 Книги:**\n"
-        "`/book Название — Автор` — оценка книги\n\n"
+        "`/book Название — Автор` — оценка книги\n"
+        "`/book -f Название` — оценить заново, не из кэша\n\n"
         "**⏰ Напоминания:**\n"
         "/remind — текущие настройки\n"
         "`/remind 08:30` — изменить время\n"
@@ -96,7 +257,7 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def clear_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
-    if llm_handler.clear_history(user_id):
+    if await llm_handler.clear_history(user_id):
         await update.message.reply_text("🧹 История диалога очищена!")
     else:
         await update.message.reply_text("📭 История и так пуста.")
@@ -109,9 +270,11 @@ async def model_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         f"⚙️ **Конфигурация:**\n\n"
         f"• Провайдер: `{cfg.LLM_PROVIDER}`\n"
         f"• Модель: `{cfg.LLM_MODEL}`\n"
-        f"• Макс. история: `{cfg.MAX_HISTORY}` сообщений\n"
+        f"• Бюджет истории: `{cfg.HISTORY_TOKEN_BUDGET}` токенов\n"
         f"• API ключ: {key_ok}\n"
-        f"• Активных диалогов: `{len(llm_handler.conversations)}`",
+        f"• Диалогов в памяти: `{len(llm_handler.conversations)}`\n"
+        f"• Запросов к LLM: `{llm_handler.scheduler.active}`"
+        f"/`{cfg.LLM_MAX_CONCURRENCY}`, в очереди `{llm_handler.scheduler.waiting}`",
         parse_mode="Markdown",
     )
 
@@ -119,11 +282,12 @@ async def model_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     username = update.effective_user.username or "?"
-    history_length = llm_handler.get_history_length(user_id)
+    history_length = await llm_handler.get_history_length(user_id)
     from . import vault  # ленивый импорт — ок тут
 
-    active_tickets = len(vault.get_active_tickets())
-    overdue = len(vault.get_overdue_tickets())
+    snap = await vault.snapshot()
+    active_tickets = len(snap.active)
+    overdue = len(snap.overdue)
 
     await update.message.reply_text(
         f"📊 **Статистика @{username}**\n\n"
@@ -161,8 +325,10 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
 
     try:
-        response = await llm_handler.get_response(user_id, message_text)
-        await send_long_message(update.message, response)
+        reply = llm_handler.stream_response(
+            user_id, message_text, on_queue=QueueNotice(update.message)
+        )
+        await stream_long_message(update.message, reply)
     except Exception as e:
         safe_logger.error(f"Error: {e}")
         await update.message.reply_text("❌ Ошибка. Попробуйте /clear и повторите.")
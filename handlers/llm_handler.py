@@ -1,10 +1,22 @@
+import asyncio
+import contextlib
+import email.utils
+import enum
+import functools
+import hashlib
 import logging
-from collections import defaultdict
-from typing import Dict, List, Optional
+import random
+import re
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import AsyncIterator, Callable, Deque, Dict, List, Optional, Tuple
 
-from openai import AsyncOpenAI
+from openai import APIConnectionError, AsyncOpenAI
 
 from config import Config
+from services.conversations import ConversationStore, SqliteConversationStore
 
 logger = logging.getLogger(__name__)
 
@@ -47,11 +59,260 @@ SYSTEM_PROMPT_BOOK = """Ты — персональный ассистент т
 Если не знаешь книгу — честно скажи и дай оценку на основе названия/автора.
 Если книга устарела — отметь это и предложи современную замену."""
 
+SYSTEM_PROMPT_ARTICLE_CHUNK = (
+    "Тебе дан фрагмент длинной статьи. Выпиши по-русски, сжатым списком, "
+    "всё существенное из него: тезисы, аргументы, факты, цифры, примеры, "
+    "рекомендации. Без вступлений и оценок — это черновик для итогового разбора."
+)
+
+SYSTEM_PROMPT_HISTORY = (
+    "Ты ведёшь краткий конспект диалога пользователя с ассистентом. "
+    "Обнови конспект с учётом новых реплик: сохрани факты о пользователе, "
+    "его цели, договорённости и открытые вопросы, опусти несущественное. "
+    "Не больше 200 слов, на языке диалога. Ответь только конспектом."
+)
+
+_CYRILLIC = re.compile(r"[а-яёА-ЯЁ]")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Грубая оценка без токенизатора: ~4 символа латиницы или ~2.5 кириллицы
+    на токен. Для бюджета истории точнее и не нужно.
+    """
+    cyr = len(_CYRILLIC.findall(text))
+    return int((len(text) - cyr) / 4 + cyr / 2.5) + 1
+
+
+def _message_tokens(message: Dict[str, str]) -> int:
+    return estimate_tokens(message["content"]) + 4  # роль и разметка сообщения
+
+
+def split_paragraphs(text: str, limit: int) -> List[str]:
+    """
+    Режет текст на куски до limit символов по границам абзацев.
+    Абзац длиннее limit режется по концу предложения, иначе по пробелу.
+    """
+    chunks: List[str] = []
+    current = ""
+    for para in re.split(r"\n+", text):
+        para = para.strip()
+        while len(para) > limit:
+            cut = para.rfind(". ", 0, limit) + 1
+            if cut < limit // 2:
+                cut = para.rfind(" ", 0, limit)
+            if cut <= 0:
+                cut = limit
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(para[:cut].strip())
+            para = para[cut:].strip()
+        if not para:
+            continue
+        if current and len(current) + 1 + len(para) > limit:
+            chunks.append(current)
+            current = para
+        else:
+            current = f"{current}\n{para}" if current else para
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+# ── Очередь запросов ──
+
+
+class Priority(enum.IntEnum):
+    CHAT = 0  # живой диалог — ответ ждут прямо сейчас
+    BATCH = 1  # статьи и книги
+    BACKGROUND = 2  # конспект истории
+
+
+@dataclass
+class Caller:
+    """Кто ждёт ответа — для справедливой очереди запросов к LLM."""
+
+    user_id: Optional[int] = None
+    priority: Priority = Priority.BATCH
+    # позиция в очереди: 1, 2, ... пока запрос ждёт; 0 — запрос пошёл
+    on_queue: Optional[Callable[[int], None]] = None
+
+
+class _Waiter:
+    __slots__ = ("caller", "future", "position")
+
+    def __init__(self, caller: Caller, future: asyncio.Future):
+        self.caller = caller
+        self.future = future
+        self.position = 0
+
+
+class LLMScheduler:
+    """
+    Очередь запросов к LLM.
+
+    Одновременно идёт не больше max_concurrency запросов. Ожидающие
+    разбиты по приоритетам, внутри приоритета пользователи обслуживаются
+    по кругу: десять ссылок одного не задержат вопрос другого.
+    pause() (ответ 429) останавливает выдачу слотов до Retry-After.
+    """
+
+    def __init__(self, max_concurrency: int = 4):
+        self.max_concurrency = max_concurrency
+        self.active = 0
+        self._queues: Dict[Priority, "OrderedDict[Optional[int], Deque[_Waiter]]"] = {
+            p: OrderedDict() for p in Priority
+        }
+        self._paused_until = 0.0
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    @property
+    def waiting(self) -> int:
+        return sum(len(q) for users in self._queues.values() for q in users.values())
+
+    @contextlib.asynccontextmanager
+    async def slot(self, caller: Caller, front: bool = False):
+        """Слот на один запрос. front — вне очереди своего пользователя (повтор)."""
+        await self._acquire(caller, front)
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self._dispatch()
+
+    def pause(self, delay: float):
+        self._paused_until = max(self._paused_until, time.monotonic() + delay)
+
+    async def _acquire(self, caller: Caller, front: bool):
+        if (
+            not self.waiting
+            and self.active < self.max_concurrency
+            and time.monotonic() >= self._paused_until
+        ):
+            self.active += 1
+            return
+
+        waiter = _Waiter(caller, asyncio.get_running_loop().create_future())
+        users = self._queues[caller.priority]
+        queue = users.setdefault(caller.user_id, deque())
+        if front:
+            queue.appendleft(waiter)
+            users.move_to_end(caller.user_id, last=False)
+        else:
+            queue.append(waiter)
+        self._dispatch()
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.cancelled():
+                self._remove(waiter)
+            else:
+                # слот выдали, но ждавший уже ушёл — возвращаем
+                self.active -= 1
+                self._dispatch()
+            raise
+
+    def _remove(self, waiter: _Waiter):
+        users = self._queues[waiter.caller.priority]
+        queue = users.get(waiter.caller.user_id)
+        if queue and waiter in queue:
+            queue.remove(waiter)
+            if not queue:
+                del users[waiter.caller.user_id]
+        self._report()
+
+    def _next(self) -> Optional[_Waiter]:
+        for users in self._queues.values():
+            while users:
+                user_id, queue = next(iter(users.items()))
+                waiter = queue.popleft()
+                # пользователь уходит в конец круга
+                if queue:
+                    users.move_to_end(user_id)
+                else:
+                    del users[user_id]
+                if not waiter.future.done():
+                    return waiter
+        return None
+
+    def _dispatch(self):
+        delay = self._paused_until - time.monotonic()
+        if delay > 0:
+            if self._timer is None:
+                self._timer = asyncio.get_running_loop().call_later(delay, self._resume)
+        else:
+            while self.active < self.max_concurrency and (waiter := self._next()):
+                self.active += 1
+                waiter.future.set_result(None)
+                self._notify(waiter, 0)
+        self._report()
+
+    def _resume(self):
+        self._timer = None
+        self._dispatch()
+
+    def _order(self):
+        """Ожидающие в том порядке, в каком получат слоты."""
+        for users in self._queues.values():
+            queues = list(users.values())
+            depth = max((len(q) for q in queues), default=0)
+            for k in range(depth):
+                for queue in queues:
+                    if k < len(queue):
+                        yield queue[k]
+
+    def _report(self):
+        for position, waiter in enumerate(self._order(), 1):
+            if waiter.position != position:
+                self._notify(waiter, position)
+
+    @staticmethod
+    def _notify(waiter: _Waiter, position: int):
+        waiter.position = position
+        if waiter.caller.on_queue:
+            try:
+                waiter.caller.on_queue(position)
+            except Exception:
+                logger.exception("Queue callback failed")
+
+
+def _retry_after(e: Exception) -> Optional[float]:
+    """Retry-After из ответа провайдера: секунды или HTTP-дата."""
+    response = getattr(e, "response", None)
+    if response is None:
+        return None
+    try:
+        if ms := response.headers.get("retry-after-ms"):
+            return float(ms) / 1000
+        value = response.headers.get("retry-after")
+        if not value:
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            when = email.utils.parsedate_to_datetime(value)
+            return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
 
 class LLMHandler:
     def __init__(self):
-        self.conversations: Dict[int, List[Dict[str, str]]] = defaultdict(list)
         self.config = Config()
+        store_args = dict(
+            max_hot=self.config.CONVERSATION_MAX_HOT,
+            idle_ttl=self.config.CONVERSATION_TTL_DAYS * 86400,
+        )
+        self.conversations: ConversationStore = (
+            SqliteConversationStore(self.config.CONVERSATION_DB, **store_args)
+            if self.config.CONVERSATION_DB
+            else ConversationStore(**store_args)
+        )
+        self._folding: Dict[int, asyncio.Task] = {}
+        # неудачные конспекты: user_id → (неудач подряд, не раньше monotonic)
+        self._fold_backoff: Dict[int, Tuple[int, float]] = {}
+        self.scheduler = LLMScheduler(self.config.LLM_MAX_CONCURRENCY)
         self.client: Optional[AsyncOpenAI] = None
 
         if not self.config.OPENROUTER_API_KEY:
@@ -62,7 +323,8 @@ class LLMHandler:
                     base_url=self.config.OPENROUTER_BASE_URL,
                     api_key=self.config.OPENROUTER_API_KEY,
                     timeout=120.0,
-                    max_retries=2,
+                    # повторы делает очередь запросов — с учётом Retry-After
+                    max_retries=0,
                     default_headers=self._build_extra_headers(),
                 )
                 logger.info("OpenRouter OK, модель: %s", self.config.LLM_MODEL)
@@ -81,112 +343,467 @@ class LLMHandler:
     #  Низкоуровневый вызов API
     # ──────────────────────────────────────────
 
-    async def _call_api(
+    def _retry_delay(self, e: Exception, attempt: int) -> Optional[float]:
+        """Через сколько повторить запрос; None — ошибка не временная."""
+        status = getattr(e, "status_code", None)
+        transient = isinstance(e, APIConnectionError) or (
+            status is not None and (status in (408, 409, 429) or status >= 500)
+        )
+        if not transient or attempt >= self.config.LLM_MAX_RETRIES:
+            return None
+        delay = _retry_after(e)
+        if delay is None:
+            # экспоненциально, с разбросом — чтобы повторы не шли залпом
+            delay = min(30.0, 2.0**attempt) * random.uniform(1.0, 1.5)
+        # ждать минутами пользователь не станет — лучше сразу сказать
+        return delay if delay <= 60 else None
+
+    @contextlib.asynccontextmanager
+    async def _api_slot(self, caller: Optional[Caller], create):
+        """
+        Слот очереди и create() в нём, с повторами временных ошибок.
+        429 — лимит общий на ключ, поэтому тормозит всю очередь, а не только
+        этот запрос. Слот держится, пока открыт контекст (на время стрима).
+        """
+        caller = caller or Caller()
+        attempt = 0
+        while True:
+            async with self.scheduler.slot(caller, front=attempt > 0):
+                try:
+                    result = await create()
+                except Exception as e:
+                    delay = self._retry_delay(e, attempt)
+                    if delay is None:
+                        raise
+                    logger.warning("LLM request failed (%s), retry in %.1f s", e, delay)
+                    if getattr(e, "status_code", None) == 429:
+                        self.scheduler.pause(delay)
+                        delay = 0.0
+                else:
+                    yield result
+                    return
+            if delay:
+                await asyncio.sleep(delay)
+            attempt += 1
+
+    async def _complete(
         self,
         messages: List[Dict[str, str]],
         temperature: float = 0.7,
         max_tokens: int = 4096,
+        caller: Optional[Caller] = None,
     ) -> str:
+        """Один запрос без стриминга. Ошибки API пробрасываются."""
+        create = functools.partial(
+            self.client.chat.completions.create,
+            model=self.config.LLM_MODEL,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature,
+        )
+        async with self._api_slot(caller, create) as response:
+            pass  # слот нужен только на время запроса
+        if response.usage:
+            logger.info(
+                "Токены: prompt=%d, completion=%d, total=%d",
+                response.usage.prompt_tokens,
+                response.usage.completion_tokens,
+                response.usage.total_tokens,
+            )
+        return response.choices[0].message.content or ""
+
+    async def _stream_chunks(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        max_tokens: int,
+        caller: Optional[Caller],
+    ) -> AsyncIterator[str]:
+        create = functools.partial(
+            self.client.chat.completions.create,
+            model=self.config.LLM_MODEL,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            stream=True,
+            stream_options={"include_usage": True},
+        )
+        # повторяется только открытие стрима: начатый ответ уже у пользователя
+        async with self._api_slot(caller, create) as stream, stream:
+            async for chunk in stream:
+                # usage приходит отдельным последним чанком без choices
+                if chunk.usage:
+                    logger.info(
+                        "Токены: prompt=%d, completion=%d, total=%d",
+                        chunk.usage.prompt_tokens,
+                        chunk.usage.completion_tokens,
+                        chunk.usage.total_tokens,
+                    )
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+
+    async def _stream_api(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float = 0.7,
+        max_tokens: int = 4096,
+        on_complete: Optional[Callable[[str], None]] = None,
+        caller: Optional[Caller] = None,
+    ) -> AsyncIterator[str]:
+        """
+        Ответ модели кусками по мере генерации; единственный путь запросов
+        с ответом пользователю. Ошибка приходит последним куском текста.
+        При LLM_STREAMING=false — одним куском.
+        on_complete получает полный ответ, только если он пришёл без ошибок.
+        """
         if not self.client:
-            return (
+            yield (
                 "❌ OpenRouter клиент не инициализирован. Проверьте OPENROUTER_API_KEY."
             )
+            return
 
+        parts: List[str] = []
         try:
-            response = await self.client.chat.completions.create(
-                model=self.config.LLM_MODEL,
-                messages=messages,
-                max_tokens=max_tokens,
-                temperature=temperature,
-            )
-            content = response.choices[0].message.content
-            if not content:
-                return "⚠️ Модель вернула пустой ответ."
-
-            if response.usage:
-                logger.info(
-                    "Токены: prompt=%d, completion=%d, total=%d",
-                    response.usage.prompt_tokens,
-                    response.usage.completion_tokens,
-                    response.usage.total_tokens,
+            if self.config.LLM_STREAMING:
+                async for piece in self._stream_chunks(
+                    messages, temperature, max_tokens, caller
+                ):
+                    parts.append(piece)
+                    yield piece
+            else:
+                content = await self._complete(
+                    messages, temperature, max_tokens, caller
                 )
-            return content
-
+                if content:
+                    parts.append(content)
+                    yield content
         except Exception as e:
-            return self._handle_api_error(e)
+            err = self._handle_api_error(e)
+            yield f"\n\n{err}" if parts else err
+            return
+
+        if not parts:
+            yield "⚠️ Модель вернула пустой ответ."
+        elif on_complete:
+            on_complete("".join(parts))
 
     def _handle_api_error(self, e: Exception) -> str:
         err = str(e)
-        if "401" in err or "Unauthorized" in err:
+        status = getattr(e, "status_code", None)
+        if status == 401 or "Unauthorized" in err:
             return "❌ Неверный API ключ OpenRouter."
-        if "402" in err or "Payment Required" in err:
+        if status == 402 or "Payment Required" in err:
             return "❌ Недостаточно средств на OpenRouter."
-        if "429" in err or "rate limit" in err.lower():
-            return "⏳ Слишком много запросов. Подождите."
+        if status == 429 or "rate limit" in err.lower():
+            # сюда доходит, только когда повторы очереди не помогли
+            return (
+                "⏳ OpenRouter ограничивает частоту запросов. Попробуйте через минуту."
+            )
         if "model" in err.lower() and "not found" in err.lower():
             return f"❌ Модель `{self.config.LLM_MODEL}` не найдена."
         logger.error("OpenRouter error: %s", e, exc_info=True)
         return f"❌ Ошибка API: {e}"
 
+    # ──────────────────────────────────────────
+    #  История диалога: бюджет токенов + конспект
+    # ──────────────────────────────────────────
+
+    def _history_window(self, history: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        """Самые свежие сообщения, влезающие в бюджет; последнее — всегда."""
+        budget = self.config.HISTORY_TOKEN_BUDGET
+        used, start = 0, len(history)
+        while start > 0:
+            cost = _message_tokens(history[start - 1])
+            if used + cost > budget and start < len(history):
+                break
+            used += cost
+            start -= 1
+        return history[start:]
+
     def _prepare_messages(self, user_id: int) -> List[Dict[str, str]]:
         messages = [{"role": "system", "content": SYSTEM_PROMPT_CHAT}]
-        history = self.conversations[user_id][-(self.config.MAX_HISTORY * 2) :]
-        messages.extend(history)
+        conv = self.conversations.get(user_id)
+        if conv.summary:
+            messages.append(
+                {
+                    "role": "system",
+                    "content": f"Краткое содержание начала диалога:\n{conv.summary}",
+                }
+            )
+        messages.extend(self._history_window(conv.messages))
         return messages
 
-    async def get_response(self, user_id: int, message: str) -> str:
-        self.conversations[user_id].append({"role": "user", "content": message})
-
-        max_items = self.config.MAX_HISTORY * 2
-        if len(self.conversations[user_id]) > max_items:
-            self.conversations[user_id] = self.conversations[user_id][-max_items:]
+    def _add_message(self, user_id: int, role: str, content: str):
+        messages = self.conversations.get(user_id).messages
+        messages.append({"role": role, "content": content})
+        # Жёсткий потолок хранимой истории: если конспект не пишется, самые
+        # старые сообщения просто выпадают, а не копятся в памяти и в базе
+        limit = 2 * self.config.HISTORY_TOKEN_BUDGET
+        total = sum(_message_tokens(m) for m in messages)
+        n = 0
+        while n < len(messages) - 2 and total > limit:
+            total -= _message_tokens(messages[n])
+            n += 1
+        if n:
+            del messages[:n]
+            logger.info("Dropped %d old message(s) over history cap", n)
+        self.conversations.touch(user_id)
+
+    def _add_user_message(self, user_id: int, message: str):
+        self._add_message(user_id, "user", message)
+
+    def _add_reply(self, user_id: int, response: str):
+        self._add_message(user_id, "assistant", response)
+        self._schedule_fold(user_id)
+
+    def _schedule_fold(self, user_id: int):
+        """
+        История перевалила за бюджет — старые сообщения уходят в конспект,
+        пока не останется половина бюджета. Конспект пишется в фоне, уже
+        после ответа: до его готовности промт просто обрезается по бюджету.
+        После неудачного конспекта следующая попытка — через паузу (1 мин,
+        удваивается до часа), а не после каждого ответа.
+        """
+        if not self.client or user_id in self._folding:
+            return
+        _, retry_at = self._fold_backoff.get(user_id, (0, 0.0))
+        if time.monotonic() < retry_at:
+            return
+        history = self.conversations.get(user_id).messages
+        budget = self.config.HISTORY_TOKEN_BUDGET
+        total = sum(_message_tokens(m) for m in history)
+        if total <= budget:
+            return
+
+        n = 0
+        while n < len(history) - 2 and total > budget // 2:
+            total -= _message_tokens(history[n])
+            n += 1
+        if n == 0:
+            return
+        task = asyncio.get_running_loop().create_task(self._fold(user_id, history[:n]))
+        self._folding[user_id] = task
+        task.add_done_callback(
+            lambda t: self._folding.get(user_id) is t and self._folding.pop(user_id)
+        )
 
+    async def _fold(self, user_id: int, old: List[Dict[str, str]]):
+        # длинные вставки в конспект целиком не нужны
+        transcript = "\n\n".join(f"{m['role']}: {m['content'][:4000]}" for m in old)
+        prev = (await self.conversations.load(user_id)).summary
+        user_msg = f"Новые реплики:\n{transcript}"
+        if prev:
+            user_msg = f"Текущий конспект:\n{prev}\n\n{user_msg}"
         try:
-            messages = self._prepare_messages(user_id)
-            response = await self._call_api(messages)
-            self.conversations[user_id].append(
-                {"role": "assistant", "content": response}
+            summary = await self._complete(
+                [
+                    {"role": "system", "content": SYSTEM_PROMPT_HISTORY},
+                    {"role": "user", "content": user_msg},
+                ],
+                temperature=0.2,
+                max_tokens=600,
+                caller=Caller(user_id, Priority.BACKGROUND),
             )
-            return response
         except Exception as e:
-            logger.error("get_response error: %s", e, exc_info=True)
-            return f"Ошибка: {e}"
+            # не страшно: попробуем после паузы, история пока под потолком
+            logger.warning("History summary failed: %s", e)
+            summary = ""
+        if not summary.strip():
+            failures = self._fold_backoff.get(user_id, (0, 0.0))[0] + 1
+            delay = min(60 * 2 ** (failures - 1), 3600)
+            self._fold_backoff[user_id] = (failures, time.monotonic() + delay)
+            return
+        self._fold_backoff.pop(user_id, None)
+
+        conv = await self.conversations.load(user_id)
+        # пока шёл запрос, историю могли очистить (тогда задачу отменяют)
+        if not conv.messages:
+            return
+        # ...или потолок истории срезал начало законспектированного
+        drop = next(
+            len(old) - d
+            for d in range(len(old) + 1)
+            if conv.messages[: len(old) - d] == old[d:]
+        )
+        del conv.messages[:drop]
+        conv.summary = summary.strip()
+        self.conversations.touch(user_id)
+        logger.info("Folded %d message(s) into history summary", len(old))
 
-    async def summarize_article(
-        self, text: str, title: str, language: str, url: str
-    ) -> str:
-        # Обрезаем текст для экономии токенов
-        max_chars = self.config.ARTICLE_MAX_CHARS
-        truncated = text[:max_chars]
-        if len(text) > max_chars:
-            truncated += "\n\n[...текст обрезан...]"
+    async def stream_response(
+        self,
+        user_id: int,
+        message: str,
+        on_queue: Optional[Callable[[int], None]] = None,
+    ) -> AsyncIterator[str]:
+        """Ответ в диалоге кусками; в историю он попадает целиком в конце."""
+        await self.conversations.load(user_id)
+        self._add_user_message(user_id, message)
+
+        parts: List[str] = []
+        caller = Caller(user_id, Priority.CHAT, on_queue)
+        async for piece in self._stream_api(
+            self._prepare_messages(user_id), caller=caller
+        ):
+            parts.append(piece)
+            yield piece
+        self._add_reply(user_id, "".join(parts))
+
+    # ──────────────────────────────────────────
+    #  Статьи: короткие — одним запросом, длинные — map-reduce
+    # ──────────────────────────────────────────
+
+    async def _map_article(
+        self, text: str, title: str, caller: Optional[Caller]
+    ) -> Optional[List[str]]:
+        """
+        Конспекты частей длинной статьи; None — статья влезает в один запрос.
+        Части идут параллельно, сколько их реально летит одновременно,
+        решает очередь запросов. Ошибка любой части отменяет остальные.
+        """
+        if not self.client or len(text) <= self.config.ARTICLE_MAX_CHARS:
+            return None
+
+        chunks = split_paragraphs(text, self.config.ARTICLE_CHUNK_CHARS)
+        total = len(chunks)
+        chunks = chunks[: self.config.ARTICLE_MAX_CHUNKS]
+        logger.info("Article «%s»: %d/%d part(s)", title, len(chunks), total)
+
+        async def summarize(i: int, chunk: str) -> str:
+            return await self._complete(
+                [
+                    {"role": "system", "content": SYSTEM_PROMPT_ARTICLE_CHUNK},
+                    {
+                        "role": "user",
+                        "content": f"Статья «{title}», часть {i} из {total}:\n\n{chunk}",
+                    },
+                ],
+                temperature=0.2,
+                max_tokens=800,
+                caller=caller,
+            )
+
+        tasks = [
+            asyncio.ensure_future(summarize(i, chunk))
+            for i, chunk in enumerate(chunks, 1)
+        ]
+        try:
+            notes = await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+        if total > len(chunks):
+            notes.append("[...дальше статья не читалась: слишком длинная...]")
+        return notes
+
+    def _article_messages(
+        self,
+        text: str,
+        title: str,
+        language: str,
+        url: str,
+        notes: Optional[List[str]] = None,
+    ) -> List[Dict[str, str]]:
+        if notes is None:
+            # Обрезаем текст для экономии токенов
+            max_chars = self.config.ARTICLE_MAX_CHARS
+            body = text[:max_chars]
+            if len(text) > max_chars:
+                body += "\n\n[...текст обрезан...]"
+            body = f"**Текст статьи:**\n{body}"
+        else:
+            parts = "\n\n".join(
+                f"### Часть {i}\n{note}" for i, note in enumerate(notes, 1)
+            )
+            body = (
+                "**Конспект статьи по частям** "
+                "(статья длинная, части законспектированы по порядку):\n\n"
+                f"{parts}"
+            )
 
         user_msg = (
             f"**Название:** {title}\n"
             f"**URL:** {url}\n"
             f"**Язык оригинала:** {language}\n"
             f"**Слов:** ~{len(text.split())}\n\n"
-            f"**Текст статьи:**\n{truncated}"
+            f"{body}"
         )
 
-        messages = [
+        return [
             {"role": "system", "content": SYSTEM_PROMPT_ARTICLE},
             {"role": "user", "content": user_msg},
         ]
-        return await self._call_api(messages, temperature=0.3)
 
-    async def evaluate_book(self, book_info: str) -> str:
-        messages = [
+    async def stream_article_summary(
+        self,
+        text: str,
+        title: str,
+        language: str,
+        url: str,
+        on_complete: Optional[Callable[[str], None]] = None,
+        caller: Optional[Caller] = None,
+    ) -> AsyncIterator[str]:
+        # части конспектируются целиком, стримится уже итоговый разбор
+        try:
+            notes = await self._map_article(text, title, caller)
+        except Exception as e:
+            yield self._handle_api_error(e)
+            return
+        messages = self._article_messages(text, title, language, url, notes)
+        async for piece in self._stream_api(
+            messages, temperature=0.3, on_complete=on_complete, caller=caller
+        ):
+            yield piece
+
+    def article_cache_key(self, text: str) -> str:
+        """Ключ саммари в кэше: тот же текст, модель и промт — тот же ответ."""
+        h = hashlib.sha256()
+        for part in (
+            self.config.LLM_MODEL,
+            SYSTEM_PROMPT_ARTICLE,
+            SYSTEM_PROMPT_ARTICLE_CHUNK,
+            str(self.config.ARTICLE_MAX_CHARS),
+            str(self.config.ARTICLE_CHUNK_CHARS),
+            str(self.config.ARTICLE_MAX_CHUNKS),
+            text,
+        ):
+            h.update(part.encode())
+            h.update(b"\0")
+        return h.hexdigest()
+
+    @staticmethod
+    def _book_messages(book_info: str) -> List[Dict[str, str]]:
+        return [
             {"role": "system", "content": SYSTEM_PROMPT_BOOK},
             {"role": "user", "content": f"Оцени книгу: {book_info}"},
         ]
-        return await self._call_api(messages, temperature=0.3)
 
-    def clear_history(self, user_id: int) -> bool:
-        if user_id in self.conversations and self.conversations[user_id]:
-            self.conversations[user_id] = []
-            return True
-        return False
+    def stream_book_evaluation(
+        self,
+        book_info: str,
+        on_complete: Optional[Callable[[str], None]] = None,
+        caller: Optional[Caller] = None,
+    ) -> AsyncIterator[str]:
+        return self._stream_api(
+            self._book_messages(book_info),
+            temperature=0.3,
+            on_complete=on_complete,
+            caller=caller,
+        )
 
-    def get_history_length(self, user_id: int) -> int:
-        return len(self.conversations.get(user_id, []))
+    def book_cache_version(self) -> str:
+        """Оценки из кэша годятся, пока не сменились модель и промт."""
+        h = hashlib.sha256(f"{self.config.LLM_MODEL}\0{SYSTEM_PROMPT_BOOK}".encode())
+        return h.hexdigest()[:16]
+
+    async def clear_history(self, user_id: int) -> bool:
+        task = self._folding.pop(user_id, None)
+        if task:
+            task.cancel()
+        self._fold_backoff.pop(user_id, None)
+        await self.conversations.load(user_id)
+        return self.conversations.clear(user_id)
+
+    async def get_history_length(self, user_id: int) -> int:
+        return len((await self.conversations.load(user_id)).messages)
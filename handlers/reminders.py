@@ -10,36 +10,32 @@ logger = logging.getLogger(__name__)
 
 
 async def morning_reminder_callback(context: ContextTypes.DEFAULT_TYPE):
-    today_tickets = vault.get_today_tickets()
-    overdue = vault.get_overdue_tickets()
-    all_active = vault.get_active_tickets()
+    snap = await vault.snapshot()
 
     lines = ["🌅 **Доброе утро! Обзор задач на сегодня:**\n"]
 
-    if overdue:
+    if snap.overdue:
         lines.append("⚠️ **Просроченные:**")
-        for t in overdue:
+        for t in snap.overdue:
             lines.append(f"  • {vault.format_ticket_short(t)}")
         lines.append("")
 
-    non_overdue = [t for t in today_tickets if t not in overdue]
-    if non_overdue:
+    if snap.due_today:
         lines.append("📋 **Запланировано на сегодня:**")
-        for t in non_overdue:
+        for t in snap.due_today:
             lines.append(f"  • {vault.format_ticket_short(t)}")
         lines.append("")
 
     # Тикеты без дедлайна
-    no_date = [t for t in all_active if t.due_date is None and t not in today_tickets]
-    if no_date:
-        lines.append(f"📌 **Без дедлайна:** {len(no_date)} тикет(ов)")
+    if snap.undated:
+        lines.append(f"📌 **Без дедлайна:** {len(snap.undated)} тикет(ов)")
 
-    if not overdue and not non_overdue and not no_date:
+    if not snap.overdue and not snap.due_today and not snap.undated:
         lines.append(
             "✨ На сегодня задач нет! Время для стратегического планирования 🚀"
         )
 
-    lines.append(f"\n📊 Активных тикетов: {len(all_active)}")
+    lines.append(f"\n📊 Активных тикетов: {len(snap.active)}")
     lines.append("\n_Управление: /tickets, /today, /done_")
 
     message = "\n".join(lines)
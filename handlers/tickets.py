@@ -1,15 +1,59 @@
 import logging
 import re
+from collections import defaultdict
 from datetime import datetime, timedelta
+from datetime import time as dt_time
 
-from telegram import Update
+import pytz
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
+from telegram.error import BadRequest
 from telegram.ext import ContextTypes
 
-from . import config, vault, vault_sync
+from . import config, sync_scheduler, vault, vault_sync
 from .common import send_long_message
 
 logger = logging.getLogger(__name__)
 
+_WEEKDAYS = ["Пн", "Вт", "Ср", "Чт", "Пт", "Сб", "Вс"]
+
+_PAGE_SIZE = 10
+_FIND_LIMIT = 20
+# вид списка → (статус в vault, заголовок)
+_TICKET_LISTS = {
+    "todo": ("todo", "📋 **Активные тикеты:**"),
+    "all": (None, "📋 **Все тикеты:**"),
+    "done": ("done", "✅ **Завершённые тикеты:**"),
+}
+
+
+def _auto_sync() -> bool:
+    return config.ICLOUD_SYNC_ENABLED and vault_sync.is_configured
+
+
+async def _edit_markdown(message, text: str):
+    try:
+        await message.edit_text(text, parse_mode="Markdown")
+    except BadRequest:
+        # stderr rclone в ответе может сломать Markdown
+        await message.edit_text(text)
+
+
+def _sync_after_write(changes: int = 1, message=None, text: str = ""):
+    """
+    Помечает vault изменённым: синхронизация склеится с соседними записями
+    и пройдёт в фоне. Если передано сообщение, результат дописывается в него.
+    Синхронизируются только файлы, которые записал бот.
+    """
+    # забираем всегда, чтобы при выключенной синхронизации список не рос
+    paths = vault.take_dirty_paths()
+    if not _auto_sync():
+        return
+
+    async def report(ok: bool, msg: str):
+        await _edit_markdown(message, f"{text}\n\n🔄 {msg}")
+
+    sync_scheduler.mark_dirty(changes, paths, report if message else None)
+
 
 def _parse_due_date(value: str) -> str:
     word = value.strip().lower()
@@ -97,7 +141,7 @@ async def ticket_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("❌ Укажите заголовок тикета.")
         return
 
-    ticket = vault.create_ticket(
+    ticket = await vault.create_ticket(
         title=parsed["title"],
         description=parsed["description"],
         priority=parsed["priority"],
@@ -105,111 +149,242 @@ async def ticket_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         tags=parsed["tags"],
     )
 
-    sync_msg = ""
-    if config.ICLOUD_SYNC_ENABLED and vault_sync.is_configured:
-        ok, msg = vault_sync.sync()
-        sync_msg = f"\n\n🔄 {msg}" if ok else ""
-
-    await update.message.reply_text(
-        f"✅ **Тикет создан!**\n\n{vault.format_ticket_full(ticket)}{sync_msg}",
+    text = f"✅ **Тикет создан!**\n\n{vault.format_ticket_full(ticket)}"
+    reply = await update.message.reply_text(
+        text + ("\n\n🔄 Синхронизация..." if _auto_sync() else ""),
         parse_mode="Markdown",
     )
+    _sync_after_write(message=reply, text=text)
 
 
-async def tickets_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Список активных тикетов. /tickets [all|done|todo]"""
-    status_filter = context.args[0] if context.args else None
-
-    if status_filter == "all":
-        tickets = vault.get_all_tickets()
-        header = "📋 **Все тикеты:**"
-    elif status_filter == "done":
-        tickets = vault.get_all_tickets(status="done")
-        header = "✅ **Завершённые тикеты:**"
-    else:
-        tickets = vault.get_active_tickets()
-        header = "📋 **Активные тикеты:**"
-
+async def _render_tickets_page(kind: str, offset: int):
+    """Текст и клавиатура одной страницы /tickets. Из vault берётся только она."""
+    status, header = _TICKET_LISTS.get(kind, _TICKET_LISTS["todo"])
+    # закрытые — инбокс + архив (читается только здесь)
+    archived = kind == "done"
+    tickets, total = await vault.get_tickets_page(
+        status, offset, _PAGE_SIZE, archived=archived
+    )
+    if offset and not tickets and total:
+        # тикеты закрыли/удалили, страницы стало меньше — показываем последнюю
+        offset = (total - 1) // _PAGE_SIZE * _PAGE_SIZE
+        tickets, total = await vault.get_tickets_page(
+            status, offset, _PAGE_SIZE, archived=archived
+        )
     if not tickets:
-        await update.message.reply_text("📭 Тикетов не найдено.")
-        return
+        return "📭 Тикетов не найдено.", None
 
     lines = [header, ""]
-    for i, t in enumerate(tickets, 1):
+    for i, t in enumerate(tickets, offset + 1):
         lines.append(f"{i}. {vault.format_ticket_short(t)}")
-    lines.append(f"\n📊 Всего: {len(tickets)}")
+    pages = (total - 1) // _PAGE_SIZE + 1
+    lines.append(f"\n📊 Всего: {total} | стр. {offset // _PAGE_SIZE + 1}/{pages}")
+
+    buttons = []
+    if offset > 0:
+        prev_offset = max(0, offset - _PAGE_SIZE)
+        buttons.append(
+            InlineKeyboardButton(
+                "◀️ Назад", callback_data=f"tickets:{kind}:{prev_offset}"
+            )
+        )
+    if offset + _PAGE_SIZE < total:
+        next_offset = offset + _PAGE_SIZE
+        buttons.append(
+            InlineKeyboardButton(
+                "Вперёд ▶️", callback_data=f"tickets:{kind}:{next_offset}"
+            )
+        )
+    return "\n".join(lines), InlineKeyboardMarkup([buttons]) if buttons else None
 
-    await send_long_message(update.message, "\n".join(lines), parse_mode="Markdown")
+
+async def tickets_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Список тикетов постранично. /tickets [all|done|todo]"""
+    kind = context.args[0] if context.args else "todo"
+    text, markup = await _render_tickets_page(
+        kind if kind in _TICKET_LISTS else "todo", 0
+    )
+    try:
+        await update.message.reply_text(
+            text, parse_mode="Markdown", reply_markup=markup
+        )
+    except BadRequest:
+        # * или _ в заголовке ломают Markdown — отправляем как есть
+        await update.message.reply_text(text, reply_markup=markup)
+
+
+async def tickets_page_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Кнопки «Назад/Вперёд» под /tickets: перерисовывают то же сообщение."""
+    query = update.callback_query
+    try:
+        _, kind, offset = query.data.split(":")
+        offset = max(0, int(offset))
+    except ValueError:
+        await query.answer()
+        return
+
+    text, markup = await _render_tickets_page(kind, offset)
+    await query.answer()
+    try:
+        await query.edit_message_text(text, parse_mode="Markdown", reply_markup=markup)
+    except BadRequest as e:
+        # двойное нажатие — страница не изменилась
+        if "not modified" in str(e).lower():
+            return
+        await query.edit_message_text(text, reply_markup=markup)
 
 
 async def today_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Задачи на сегодня."""
-    today_tickets = vault.get_today_tickets()
-    overdue = vault.get_overdue_tickets()
+    snap = await vault.snapshot()
 
     lines = ["🌅 **Задачи на сегодня:**\n"]
 
-    if overdue:
+    if snap.overdue:
         lines.append("⚠️ **Просроченные:**")
-        for t in overdue:
+        for t in snap.overdue:
             lines.append(f"  • {vault.format_ticket_short(t)}")
         lines.append("")
 
-    active = [t for t in today_tickets if t not in overdue]
-    if active:
+    if snap.today:
         lines.append("📋 **На сегодня:**")
-        for t in active:
+        for t in snap.today:
             lines.append(f"  • {vault.format_ticket_short(t)}")
-    elif not overdue:
+    elif not snap.overdue:
         lines.append("✨ На сегодня задач нет! Можно планировать новые.")
 
-    total_active = len(vault.get_active_tickets())
-    lines.append(f"\n📊 Всего активных: {total_active}")
+    lines.append(f"\n📊 Всего активных: {len(snap.active)}")
 
     await send_long_message(update.message, "\n".join(lines), parse_mode="Markdown")
 
 
-async def done_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """/done T-240115-a3f2"""
-    if not context.args:
-        await update.message.reply_text(
-            "Использование: `/done T-XXXXXX-XXXX`", parse_mode="Markdown"
-        )
+async def week_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Задачи с дедлайном на ближайшие 7 дней, по дням."""
+    tickets = await vault.get_upcoming_tickets(7)
+    if not tickets:
+        await update.message.reply_text("📭 На ближайшую неделю задач с дедлайном нет.")
         return
 
-    ticket_id = context.args[0]
-    if vault.update_status(ticket_id, "done"):
+    by_day = defaultdict(list)
+    for t in tickets:
+        by_day[t.due_date].append(t)
+
+    lines = ["🗓 **Задачи на неделю:**\n"]
+    today = datetime.now().date()
+    for offset in range(7):
+        day = today + timedelta(days=offset)
+        day_tickets = by_day.get(day.isoformat())
+        if not day_tickets:
+            continue
+        label = {0: "Сегодня", 1: "Завтра"}.get(offset, _WEEKDAYS[day.weekday()])
+        lines.append(f"📅 **{label}, {day.strftime('%d.%m')}:**")
+        for t in day_tickets:
+            lines.append(f"  • {vault.format_ticket_short(t)}")
+        lines.append("")
+
+    lines.append(f"📊 Всего на неделю: {len(tickets)}")
+
+    await send_long_message(update.message, "\n".join(lines), parse_mode="Markdown")
+
+
+async def find_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/find слова — поиск по заголовкам, описаниям и тегам."""
+    query = " ".join(context.args) if context.args else ""
+    if not query.strip():
         await update.message.reply_text(
-            f"✅ Тикет `{ticket_id}` завершён!", parse_mode="Markdown"
+            "Использование: `/find слова`\n"
+            "Ищет тикеты, где есть все слова (можно начало слова: `отч` найдёт «отчёт»).",
+            parse_mode="Markdown",
         )
-        if config.ICLOUD_SYNC_ENABLED and vault_sync.is_configured:
-            vault_sync.sync()
-    else:
+        return
+
+    tickets = await vault.search_tickets(query)
+    if not tickets:
+        await update.message.reply_text("🔍 Ничего не найдено.")
+        return
+
+    lines = [f"🔍 **Найдено: {len(tickets)}**", ""]
+    for t in tickets[:_FIND_LIMIT]:
+        lines.append(f"• {vault.format_ticket_short(t)}")
+    if len(tickets) > _FIND_LIMIT:
+        lines.append(f"\n…и ещё {len(tickets) - _FIND_LIMIT}, уточните запрос.")
+
+    await send_long_message(update.message, "\n".join(lines), parse_mode="Markdown")
+
+
+def _parse_ticket_ids(args) -> list:
+    """ID из аргументов команды: через пробел и/или запятую, без дублей."""
+    ids = [tid for arg in args or [] for tid in arg.split(",") if tid.strip()]
+    return list(dict.fromkeys(tid.strip() for tid in ids))
+
+
+def _format_results(results: dict, ok_template: str) -> str:
+    return "\n".join(
+        ok_template.format(tid) if ok else f"❌ Тикет `{tid}` не найден."
+        for tid, ok in results.items()
+    )
+
+
+async def done_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/done T-240115-a3f2 [T-240116-b4c1 ...]"""
+    ticket_ids = _parse_ticket_ids(context.args)
+    if not ticket_ids:
         await update.message.reply_text(
-            f"❌ Тикет `{ticket_id}` не найден.", parse_mode="Markdown"
+            "Использование: `/done T-XXXXXX-XXXX [T-XXXXXX-XXXX ...]`",
+            parse_mode="Markdown",
         )
+        return
+
+    results = await vault.update_statuses(ticket_ids, "done")
+    await update.message.reply_text(
+        _format_results(results, "✅ Тикет `{}` завершён!"), parse_mode="Markdown"
+    )
+    if any(results.values()):
+        _sync_after_write(sum(results.values()))
 
 
 async def delete_ticket_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """/delete_ticket T-240115-a3f2"""
-    if not context.args:
+    """/delete_ticket T-240115-a3f2 [T-240116-b4c1 ...]"""
+    ticket_ids = _parse_ticket_ids(context.args)
+    if not ticket_ids:
         await update.message.reply_text(
-            "Использование: `/delete_ticket T-XXXXXX-XXXX`",
+            "Использование: `/delete_ticket T-XXXXXX-XXXX [T-XXXXXX-XXXX ...]`",
             parse_mode="Markdown",
         )
         return
 
-    ticket_id = context.args[0]
-    if vault.delete_ticket(ticket_id):
-        await update.message.reply_text(
-            f"🗑 Тикет `{ticket_id}` удалён.", parse_mode="Markdown"
-        )
-        if config.ICLOUD_SYNC_ENABLED and vault_sync.is_configured:
-            vault_sync.sync()
-    else:
+    results = await vault.delete_tickets(ticket_ids)
+    await update.message.reply_text(
+        _format_results(results, "🗑 Тикет `{}` удалён."), parse_mode="Markdown"
+    )
+    if any(results.values()):
+        _sync_after_write(sum(results.values()))
+
+
+async def reschedule_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/reschedule tomorrow T-240115-a3f2 [T-240116-b4c1 ...]"""
+    ticket_ids = _parse_ticket_ids(context.args[1:] if context.args else [])
+    if not ticket_ids:
         await update.message.reply_text(
-            f"❌ Тикет `{ticket_id}` не найден.", parse_mode="Markdown"
+            "Использование: `/reschedule ДАТА T-XXXXXX-XXXX [T-XXXXXX-XXXX ...]`\n"
+            "ДАТА: `today`, `tomorrow`, `2024-12-31`, `31.12.2024`",
+            parse_mode="Markdown",
         )
+        return
+
+    try:
+        due_date = _parse_due_date(context.args[0])
+    except ValueError as e:
+        await update.message.reply_text(f"❌ {e}")
+        return
+
+    results = await vault.reschedule_tickets(ticket_ids, due_date)
+    await update.message.reply_text(
+        _format_results(results, f"📅 Тикет `{{}}` перенесён на {due_date}."),
+        parse_mode="Markdown",
+    )
+    if any(results.values()):
+        _sync_after_write(sum(results.values()))
 
 
 async def sync_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -224,6 +399,54 @@ async def sync_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
         return
 
-    await update.message.reply_text("🔄 Синхронизация...")
-    ok, msg = vault_sync.sync()
-    await update.message.reply_text(msg, parse_mode="Markdown")
+    state = sync_scheduler.status()
+    status = await update.message.reply_text(f"🔄 Синхронизация...\n{state}")
+
+    async def report(ok: bool, msg: str):
+        await _edit_markdown(status, f"{msg}\n{sync_scheduler.status()}")
+
+    # rclone может идти минутами — бот тем временем отвечает на другие команды
+    sync_scheduler.flush(report)
+
+
+async def archive_job_callback(context: ContextTypes.DEFAULT_TYPE):
+    moved = await vault.archive_done(config.ARCHIVE_AFTER_DAYS)
+    if moved:
+        logger.info("Archived %d closed ticket(s)", moved)
+        _sync_after_write(moved)
+
+
+async def full_sync_job_callback(context: ContextTypes.DEFAULT_TYPE):
+    # правки со стороны Obsidian бот не видит — их забирает полный проход
+    sync_scheduler.flush()
+
+
+def setup_sync(job_queue):
+    if not _auto_sync() or config.SYNC_FULL_INTERVAL_MINUTES <= 0:
+        logger.info("Periodic full sync disabled")
+        return
+
+    interval = config.SYNC_FULL_INTERVAL_MINUTES * 60
+    job_queue.run_repeating(
+        full_sync_job_callback, interval=interval, first=interval, name="full_sync"
+    )
+    logger.info("Full vault sync every %d min", config.SYNC_FULL_INTERVAL_MINUTES)
+
+
+def setup_archive(job_queue):
+    if config.ARCHIVE_AFTER_DAYS <= 0:
+        logger.info("Ticket archiving disabled")
+        return
+
+    tz = pytz.timezone(config.TIMEZONE)
+    job_queue.run_daily(
+        archive_job_callback,
+        time=dt_time(hour=config.ARCHIVE_HOUR, minute=0, tzinfo=tz),
+        name="archive_tickets",
+    )
+    logger.info(
+        "Ticket archiving scheduled at %02d:00 %s (older than %d days)",
+        config.ARCHIVE_HOUR,
+        config.TIMEZONE,
+        config.ARCHIVE_AFTER_DAYS,
+    )
@@ -0,0 +1,218 @@
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from services.article_parser import ParsedArticle
+
+logger = logging.getLogger(__name__)
+
+# Метки рекламных кампаний и переходов — на содержимое страницы не влияют
+_TRACKING_PARAMS = {
+    "fbclid",
+    "gclid",
+    "yclid",
+    "mc_cid",
+    "mc_eid",
+    "igshid",
+    "ref",
+    "ref_src",
+    "source",
+    "_hsenc",
+    "_hsmi",
+}
+
+
+def canonical_url(url: str) -> str:
+    """
+    Одна и та же статья по разным ссылкам: регистр хоста, www, порт
+    по умолчанию, якорь, utm-метки, порядок параметров, слэш в конце.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower() or "https"
+    host = (parts.hostname or "").lower()
+    if host.startswith("www."):
+        host = host[4:]
+    if parts.port and (scheme, parts.port) not in (("http", 80), ("https", 443)):
+        host = f"{host}:{parts.port}"
+
+    path = parts.path.rstrip("/") or "/"
+    query = sorted(
+        (k, v)
+        for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if not k.lower().startswith("utm_") and k.lower() not in _TRACKING_PARAMS
+    )
+    return urlunsplit((scheme, host, path, urlencode(query), ""))
+
+
+@dataclass
+class CachedArticle:
+    title: str
+    language: str
+    word_count: int
+    summary: str
+
+
+class ArticleCache:
+    """
+    Кэш саммари статей в SQLite.
+
+    Саммари хранятся по ключу содержимого (хэш текста, модели и промта):
+    одна статья по двум ссылкам или от двух людей суммаризуется один раз,
+    а изменившаяся статья даёт новый ключ и суммаризуется заново.
+    Отдельно ссылка → ключ: в пределах url_ttl повторная ссылка отвечается
+    без скачивания, позже статья скачивается и сверяется по ключу.
+
+    Размер ограничен max_bytes (вытесняются давно не использованные), саммари
+    старше ttl не отдаются. Без db_path кэш живёт в памяти до рестарта.
+    """
+
+    _VERSION = 1
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS summaries (
+            key TEXT PRIMARY KEY,
+            summary TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            created REAL NOT NULL,
+            used REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS summaries_used ON summaries (used);
+        CREATE TABLE IF NOT EXISTS urls (
+            url TEXT PRIMARY KEY,
+            key TEXT NOT NULL,
+            title TEXT NOT NULL,
+            language TEXT NOT NULL,
+            word_count INTEGER NOT NULL,
+            fetched REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS urls_key ON urls (key);
+    """
+
+    def __init__(
+        self,
+        db_path: str = "",
+        max_bytes: int = 50 * 2**20,
+        ttl: float = 30 * 86400,
+        url_ttl: float = 86400,
+    ):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.url_ttl = url_ttl
+        if db_path:
+            Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        # вызовы идут из пула потоков — соединение одно, доступ под локом
+        self._db = sqlite3.connect(db_path or ":memory:", check_same_thread=False)
+        self._lock = threading.Lock()
+        self._db.execute("PRAGMA journal_mode=WAL")
+        if self._db.execute("PRAGMA user_version").fetchone()[0] != self._VERSION:
+            # это только кэш — при смене схемы начинаем с нуля
+            self._db.executescript(
+                "DROP TABLE IF EXISTS summaries; DROP TABLE IF EXISTS urls;"
+            )
+            self._db.execute(f"PRAGMA user_version = {self._VERSION}")
+        self._db.executescript(self._SCHEMA)
+
+    # ── синхронное ядро ──
+
+    def _summary(self, key: str, now: float) -> Optional[str]:
+        row = self._db.execute(
+            "SELECT summary FROM summaries WHERE key = ? AND created > ?",
+            (key, now - self.ttl),
+        ).fetchone()
+        if row is None:
+            return None
+        self._db.execute("UPDATE summaries SET used = ? WHERE key = ?", (now, key))
+        self._db.commit()
+        return row[0]
+
+    def lookup_url_sync(self, url: str) -> Optional[CachedArticle]:
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT key, title, language, word_count FROM urls "
+                "WHERE url = ? AND fetched > ?",
+                (canonical_url(url), now - self.url_ttl),
+            ).fetchone()
+            if row is None:
+                return None
+            summary = self._summary(row[0], now)
+        if summary is None:
+            return None
+        return CachedArticle(row[1], row[2], row[3], summary)
+
+    def get_sync(self, key: str) -> Optional[str]:
+        with self._lock:
+            return self._summary(key, time.time())
+
+    def put_sync(
+        self,
+        url: str,
+        article: ParsedArticle,
+        key: str,
+        summary: Optional[str] = None,
+    ):
+        """Запоминает ссылку → ключ; с summary — ещё и само саммари."""
+        now = time.time()
+        with self._lock:
+            if summary is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO summaries VALUES (?, ?, ?, ?, ?)",
+                    (key, summary, len(summary.encode()), now, now),
+                )
+            self._db.execute(
+                "INSERT OR REPLACE INTO urls VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    canonical_url(url),
+                    key,
+                    article.title,
+                    article.language,
+                    article.word_count,
+                    now,
+                ),
+            )
+            if summary is not None:
+                self._evict(now)
+            self._db.commit()
+
+    def _evict(self, now: float):
+        self._db.execute("DELETE FROM summaries WHERE created <= ?", (now - self.ttl,))
+        total = self._db.execute("SELECT SUM(size) FROM summaries").fetchone()[0] or 0
+        if total > self.max_bytes:
+            victims = []
+            for key, size in self._db.execute(
+                "SELECT key, size FROM summaries ORDER BY used"
+            ):
+                if total <= self.max_bytes:
+                    break
+                victims.append((key,))
+                total -= size
+            self._db.executemany("DELETE FROM summaries WHERE key = ?", victims)
+            logger.info("Article cache: evicted %d summary(ies)", len(victims))
+        # ссылки на вытесненные саммари больше не нужны
+        self._db.execute(
+            "DELETE FROM urls WHERE key NOT IN (SELECT key FROM summaries)"
+        )
+
+    # ── асинхронные обёртки: SQLite не трогает event loop ──
+
+    async def lookup_url(self, url: str) -> Optional[CachedArticle]:
+        """Свежее саммари по ссылке, без скачивания статьи."""
+        return await asyncio.to_thread(self.lookup_url_sync, url)
+
+    async def get(self, key: str) -> Optional[str]:
+        """Саммари по ключу содержимого."""
+        return await asyncio.to_thread(self.get_sync, key)
+
+    async def put(
+        self,
+        url: str,
+        article: ParsedArticle,
+        key: str,
+        summary: Optional[str] = None,
+    ):
+        await asyncio.to_thread(self.put_sync, url, article, key, summary)
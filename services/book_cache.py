@@ -0,0 +1,199 @@
+import asyncio
+import logging
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Автор отделяется только явно: «X by Автор», «X автор Y». Подзаголовок
+# («X: …», «X, …», «X (…)», «X — …») — часть названия: «Thinking, Fast
+# and Slow» и «Thinking: A Very Short Introduction» — разные книги. Тире
+# тоже не отрезается: за ним чаще подзаголовок («Star Wars — A New Hope»),
+# чем автор, а имя от подзаголовка по одному тексту не отличить
+_AUTHOR_SEP = re.compile(r"\s+(?:by|автор)\s+", re.IGNORECASE)
+_ARTICLE = re.compile(r"^(?:the|a|an)\s+")
+_NON_WORD = re.compile(r"[^\w\s]|_")
+
+_TRANSLIT = str.maketrans(
+    {
+        "а": "a",
+        "б": "b",
+        "в": "v",
+        "г": "g",
+        "д": "d",
+        "е": "e",
+        "ж": "zh",
+        "з": "z",
+        "и": "i",
+        "й": "i",
+        "к": "k",
+        "л": "l",
+        "м": "m",
+        "н": "n",
+        "о": "o",
+        "п": "p",
+        "р": "r",
+        "с": "s",
+        "т": "t",
+        "у": "u",
+        "ф": "f",
+        "х": "h",
+        "ц": "ts",
+        "ч": "ch",
+        "ш": "sh",
+        "щ": "sch",
+        "ъ": "",
+        "ы": "y",
+        "ь": "",
+        "э": "e",
+        "ю": "yu",
+        "я": "ya",
+    }
+)
+
+
+def normalize_title(query: str) -> str:
+    """
+    Ключ книги: название с подзаголовком, но без автора и артикля в начале,
+    в нижнем регистре, латиницей, без пунктуации.
+
+    >>> normalize_title("Accelerate by Nicole Forsgren")
+    'accelerate'
+    >>> normalize_title("Star Wars - A New Hope")
+    'star wars a new hope'
+    >>> normalize_title("Star Wars — The Empire Strikes Back")
+    'star wars the empire strikes back'
+    >>> normalize_title("Гарри Поттер - Тайная комната")
+    'garri potter tainaya komnata'
+    >>> normalize_title("Гарри Поттер — Узник Азкабана")
+    'garri potter uznik azkabana'
+    """
+    title = _AUTHOR_SEP.split(query.strip(), 1)[0].strip() or query
+    title = title.casefold().replace("ё", "е").translate(_TRANSLIT)
+    # дефис и тире — разделители слов: «Data-Intensive» = «Data Intensive»
+    title = re.sub(r"[-—–]", " ", title)
+    return _ARTICLE.sub("", " ".join(_NON_WORD.sub("", title).split()))
+
+
+def _trigrams(key: str) -> Set[str]:
+    grams = set()
+    for word in key.split():
+        padded = f"  {word} "
+        grams.update(padded[i : i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+@dataclass
+class BookMatch:
+    query: str  # запрос, на который оценка была получена
+    evaluation: str
+    score: float  # 1.0 — то же название после нормализации
+
+
+class BookCache:
+    """
+    Кэш оценок книг. Хранится в SQLite, в памяти — словарь по
+    нормализованному названию и триграммный индекс для нечётких совпадений
+    («Phoenix Projects» ~ «The Phoenix Project»): поиск не ходит в базу.
+    Нечёткое совпадение засчитывается, только если первое слово названия
+    совпадает целиком, — «Clean Coder» не получит оценку «Clean Code».
+
+    version — хэш модели и промта; оценки другой версии при загрузке
+    отбрасываются. Без db_path кэш живёт только в памяти.
+    """
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS books (
+            key TEXT PRIMARY KEY,
+            query TEXT NOT NULL,
+            evaluation TEXT NOT NULL,
+            version TEXT NOT NULL,
+            created REAL NOT NULL
+        );
+    """
+
+    def __init__(self, db_path: str = "", version: str = "", threshold: float = 0.9):
+        self.version = version
+        self.threshold = threshold
+        if db_path:
+            Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(db_path or ":memory:", check_same_thread=False)
+        self._lock = threading.Lock()
+        self._db.executescript(self._SCHEMA)
+        self._db.execute("DELETE FROM books WHERE version != ?", (version,))
+        self._db.commit()
+
+        self._books: Dict[str, Tuple[str, str]] = {}  # key → (query, evaluation)
+        self._grams: Dict[str, Set[str]] = {}  # key → триграммы
+        self._postings: Dict[str, Set[str]] = defaultdict(set)  # триграмма → keys
+        stale = []
+        for key, query, evaluation in self._db.execute(
+            "SELECT key, query, evaluation FROM books"
+        ).fetchall():
+            if key == normalize_title(query):
+                self._add(key, query, evaluation)
+            else:
+                stale.append((key, query, evaluation))
+        # ключи от прежней нормализации — переложить под новые
+        for key, query, evaluation in stale:
+            self._db.execute("DELETE FROM books WHERE key = ?", (key,))
+            key = normalize_title(query)
+            if key and key not in self._books:
+                self._db.execute(
+                    "INSERT INTO books VALUES (?, ?, ?, ?, ?)",
+                    (key, query, evaluation, version, time.time()),
+                )
+                self._add(key, query, evaluation)
+        self._db.commit()
+        logger.info("Book cache: %d book(s)", len(self._books))
+
+    def _add(self, key: str, query: str, evaluation: str):
+        self._books[key] = (query, evaluation)
+        if key not in self._grams:
+            self._grams[key] = _trigrams(key)
+            for gram in self._grams[key]:
+                self._postings[gram].add(key)
+
+    def lookup(self, query: str) -> Optional[BookMatch]:
+        """Лучшая оценка с похожим названием (коэффициент Дайса по триграммам)."""
+        key = normalize_title(query)
+        if not key:
+            return None
+        with self._lock:
+            if key in self._books:
+                return BookMatch(*self._books[key], 1.0)
+
+            grams = _trigrams(key)
+            first = key.split()[0]
+            shared = Counter(k for g in grams for k in self._postings.get(g, ()))
+            best, score = None, 0.0
+            for other, common in shared.items():
+                if other.split()[0] != first:
+                    continue
+                sim = 2 * common / (len(grams) + len(self._grams[other]))
+                if sim > score:
+                    best, score = other, sim
+            if best is None or score < self.threshold:
+                return None
+            return BookMatch(*self._books[best], score)
+
+    def put_sync(self, query: str, evaluation: str):
+        key = normalize_title(query)
+        if not key:
+            return
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO books VALUES (?, ?, ?, ?, ?)",
+                (key, query, evaluation, self.version, time.time()),
+            )
+            self._db.commit()
+            self._add(key, query, evaluation)
+
+    async def put(self, query: str, evaluation: str):
+        await asyncio.to_thread(self.put_sync, query, evaluation)
@@ -0,0 +1,209 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# (user_id, сжатый диалог или None — удалить, время изменения)
+_Row = Tuple[int, Optional[bytes], float]
+
+
+@dataclass
+class Conversation:
+    messages: List[Dict[str, str]] = field(default_factory=list)
+    summary: str = ""  # конспект сообщений, выпавших из бюджета истории
+    updated: float = field(default_factory=time.time)
+
+
+def _pack(user_id: int, conv: Conversation) -> _Row:
+    if not conv.messages and not conv.summary:
+        return user_id, None, conv.updated
+    data = json.dumps(
+        {"messages": conv.messages, "summary": conv.summary}, ensure_ascii=False
+    )
+    return user_id, zlib.compress(data.encode()), conv.updated
+
+
+def _unpack(blob: bytes, updated: float) -> Conversation:
+    data = json.loads(zlib.decompress(blob))
+    return Conversation(data["messages"], data["summary"], updated)
+
+
+class ConversationStore:
+    """
+    Диалоги пользователей с ограниченной памятью.
+
+    В памяти — не больше max_hot недавно активных диалогов (LRU), диалоги
+    без активности дольше idle_ttl забываются. Вытесненный диалог этот
+    класс просто теряет; SqliteConversationStore сбрасывает его на диск.
+    Изменения отмечаются touch() и пишутся пачкой в flush() (write-behind),
+    туда же попадают вытесненные изменённые диалоги. Диск читается только
+    в load() из пула потоков — event loop на SQLite не ждёт.
+    """
+
+    def __init__(self, max_hot: int = 100, idle_ttl: float = 30 * 86400):
+        self.max_hot = max_hot
+        self.idle_ttl = idle_ttl
+        self._hot: "OrderedDict[int, Conversation]" = OrderedDict()
+        self._dirty: Set[int] = set()
+        # вытесненные, но ещё не записанные: до конца flush() читаются отсюда
+        self._spilled: Dict[int, Conversation] = {}
+
+    def __len__(self) -> int:
+        return len(self._hot)
+
+    async def load(self, user_id: int) -> Conversation:
+        """Диалог с подгрузкой с диска; звать до get() в начале запроса."""
+        if user_id not in self._hot and user_id not in self._spilled:
+            conv = await asyncio.to_thread(self._load, user_id)
+            # пока читали, диалог мог появиться в памяти — он свежее
+            if user_id not in self._hot and user_id not in self._spilled:
+                self._put(user_id, conv)
+        return self.get(user_id)
+
+    def get(self, user_id: int) -> Conversation:
+        conv = self._hot.get(user_id)
+        if conv is not None:
+            self._hot.move_to_end(user_id)
+            return conv
+
+        conv = self._spilled.pop(user_id, None)
+        if conv is not None:
+            self._dirty.add(user_id)
+        else:
+            # без load(): диалог вытеснили посреди запроса, а flush() уже
+            # записал его — редкий случай, читаем синхронно
+            conv = self._load(user_id)
+        return self._put(user_id, conv)
+
+    def _put(self, user_id: int, conv: Optional[Conversation]) -> Conversation:
+        if conv is None or conv.updated < time.time() - self.idle_ttl:
+            conv = Conversation()
+        self._hot[user_id] = conv
+        self._evict()
+        return conv
+
+    def touch(self, user_id: int):
+        """Диалог изменился: он уйдёт на диск при следующем flush()."""
+        self.get(user_id).updated = time.time()
+        self._dirty.add(user_id)
+
+    def clear(self, user_id: int) -> bool:
+        conv = self.get(user_id)
+        had = bool(conv.messages or conv.summary)
+        conv.messages, conv.summary = [], ""
+        self.touch(user_id)
+        return had
+
+    def _evict(self):
+        while len(self._hot) > self.max_hot:
+            user_id, conv = self._hot.popitem(last=False)
+            if user_id in self._dirty:
+                self._dirty.discard(user_id)
+                self._spilled[user_id] = conv
+
+    def _take_dirty(self) -> Tuple[List[_Row], float]:
+        """Снимок изменённых диалогов и порог простоя; в потоке event loop."""
+        cutoff = time.time() - self.idle_ttl
+        for user_id in [u for u, c in self._hot.items() if c.updated < cutoff]:
+            del self._hot[user_id]
+            self._dirty.discard(user_id)
+        rows = [_pack(u, self._hot[u]) for u in self._dirty]
+        rows += [_pack(u, c) for u, c in self._spilled.items()]
+        self._dirty.clear()
+        return rows, cutoff
+
+    async def flush(self):
+        """Записать изменённые и вытесненные диалоги, удалить заброшенные."""
+        spilled = dict(self._spilled)
+        rows, cutoff = self._take_dirty()
+        try:
+            await asyncio.to_thread(self._write, rows, cutoff)
+        except Exception:
+            # не записалось — попробуем в следующий раз
+            self._dirty.update(u for u, _, _ in rows if u in self._hot)
+            raise
+        for user_id, conv in spilled.items():
+            # вернувшийся в память за время записи уже не здесь
+            if self._spilled.get(user_id) is conv:
+                del self._spilled[user_id]
+
+    # ── хранилище за пределами памяти; здесь его нет ──
+
+    def _load(self, user_id: int) -> Optional[Conversation]:
+        return None
+
+    def _write(self, rows: List[_Row], cutoff: Optional[float]):
+        pass
+
+
+class SqliteConversationStore(ConversationStore):
+    """
+    Диалоги в памяти + сжатые (zlib) копии в SQLite: вытесненные из памяти
+    и пережившие рестарт диалоги подгружаются при следующем сообщении.
+    """
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS conversations (
+            user_id INTEGER PRIMARY KEY,
+            data BLOB NOT NULL,
+            updated REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS conversations_updated
+            ON conversations (updated);
+    """
+
+    def __init__(self, db_path: str, max_hot: int = 100, idle_ttl: float = 30 * 86400):
+        super().__init__(max_hot, idle_ttl)
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        # читают и пишут из пула потоков; редкий синхронный _load — из event loop
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(self._SCHEMA)
+
+    def _load(self, user_id: int) -> Optional[Conversation]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT data, updated FROM conversations WHERE user_id = ?",
+                (user_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        try:
+            return _unpack(*row)
+        except (zlib.error, ValueError, KeyError):
+            logger.warning("Conversation of %d is corrupted, starting over", user_id)
+            return None
+
+    def _write(self, rows: List[_Row], cutoff: Optional[float]):
+        if not rows and cutoff is None:
+            return
+        with self._lock:
+            # снимок flush мог устареть, пока ждал лок, — более свежую
+            # запись (например, от параллельного flush) не затираем
+            self._db.executemany(
+                "INSERT INTO conversations VALUES (?, ?, ?) "
+                "ON CONFLICT (user_id) DO UPDATE "
+                "SET data = excluded.data, updated = excluded.updated "
+                "WHERE excluded.updated >= conversations.updated",
+                [r for r in rows if r[1] is not None],
+            )
+            self._db.executemany(
+                "DELETE FROM conversations WHERE user_id = ? AND updated <= ?",
+                [(u, t) for u, data, t in rows if data is None],
+            )
+            if cutoff is not None:
+                self._db.execute(
+                    "DELETE FROM conversations WHERE updated < ?", (cutoff,)
+                )
+            self._db.commit()
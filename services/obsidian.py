@@ -1,33 +1,47 @@
+import asyncio
+import bisect
+import contextlib
+import functools
 import logging
+import os
 import re
+import sqlite3
+import threading
+import time
 import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass, field
-from datetime import date, datetime
+from datetime import date, datetime, timedelta
 from pathlib import Path
-from typing import Callable, List, Optional
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 
 logger = logging.getLogger(__name__)
 
 PRIORITY_EMOJI = {"critical": "🔴", "high": "🟠", "medium": "🟡", "low": "🟢"}
 STATUS_EMOJI = {"todo": "📋", "in_progress": "🔄", "done": "✅", "cancelled": "❌"}
+PRIORITY_ORDER = {"critical": 0, "high": 1, "medium": 2, "low": 3}
 
 
-@dataclass
+@dataclass(slots=True)
 class Ticket:
+    """
+    Тикет. Компактный (slots, общий пустой кортеж тегов), потому что при
+    скане создаётся на каждую задачу vault. Приоритет, теги и описание
+    хранятся в строке меты %%…%%, created/updated — только в памяти
+    при создании ботом, в Markdown их нет.
+    """
+
     id: str
     title: str
     description: str = ""
     status: str = "todo"
     priority: str = "medium"
     due_date: Optional[str] = None
+    done_date: Optional[str] = None
     created: str = ""
     updated: str = ""
-    tags: List[str] = field(default_factory=list)
-
-    def __post_init__(self):
-        now = datetime.now().isoformat(timespec="seconds")
-        self.created = self.created or now
-        self.updated = self.updated or now
+    tags: Tuple[str, ...] = ()
 
     def to_task_line(self) -> str:
         cb = "[x]" if self.status == "done" else "[ ]"
@@ -35,85 +49,1021 @@ class Ticket:
         if self.due_date:
             parts.append(f"📅 {self.due_date}")
         if self.status == "done":
-            parts.append(f"✅ {date.today().isoformat()}")
+            parts.append(f"✅ {self.done_date or date.today().isoformat()}")
         return " ".join(parts)
 
     def to_meta_line(self) -> str:
         meta = f"id:{self.id}"
         if self.priority != "medium":
             meta += f" p:{self.priority}"
+        if self.tags:
+            meta += f" tags:{','.join(self.tags)}"
+        if self.description:
+            meta += f" desc:{self.description}"
         return f"%%{meta}%%"
 
 
+def _meta_fields(description: str, tags: Iterable[str]) -> Tuple[str, Tuple[str, ...]]:
+    """
+    Описание и теги в том виде, в каком они переживут строку меты: одна
+    строка без "%", теги без пробелов и запятых.
+    """
+    description = " ".join(description.replace("%", " ").split())
+    tags = ("-".join(tag.replace(",", " ").replace("%", " ").split()) for tag in tags)
+    return description, tuple(tag for tag in tags if tag)
+
+
+@dataclass
+class TicketSnapshot:
+    """Срез активных тикетов для /today, /stats и утреннего напоминания."""
+
+    overdue: List[Ticket] = field(default_factory=list)
+    due_today: List[Ticket] = field(default_factory=list)
+    undated: List[Ticket] = field(default_factory=list)
+    today: List[Ticket] = field(default_factory=list)  # due_today + undated
+    active: List[Ticket] = field(default_factory=list)
+    done_count: int = 0
+
+
+@dataclass
+class _FileEntry:
+    """Распарсенный дневной файл + stat, по которому проверяем свежесть."""
+
+    mtime_ns: int
+    size: int
+    tickets: List[Ticket]
+    lines: Dict[str, int] = field(default_factory=dict)  # id → номер строки задачи
+    newlines: int = 0  # сколько "\n" в файле — номер строки для дозаписи
+
+
+# Порядок выдачи тикетов: (ранг приоритета, дедлайн или "9999", id).
+# Ключ полный, поэтому годится как курсор для постраничного обхода.
+_Key = Tuple[int, str, str]
+
+
+def _sort_key(t: Ticket) -> _Key:
+    return PRIORITY_ORDER.get(t.priority, 2), t.due_date or "9999", t.id
+
+
+_RE_WORD = re.compile(r"\w+")
+
+
+def _tokens(text: str) -> List[str]:
+    """Слова для поиска: без регистра, ё = е."""
+    return _RE_WORD.findall(text.casefold().replace("ё", "е"))
+
+
+def _ticket_terms(t: Ticket) -> set:
+    return set(_tokens(" ".join((t.title, t.description, *t.tags))))
+
+
+def _due_match(t: Ticket, start: Optional[str], end: Optional[str]) -> bool:
+    if not (start or end):
+        return True
+    due = t.due_date
+    return bool(due) and (not start or due >= start) and (not end or due < end)
+
+
+class _MemoryIndex:
+    """Индекс тикетов в памяти процесса. Строится заново после рестарта."""
+
+    def __init__(self):
+        self._files: Dict[Path, _FileEntry] = {}
+        self._locations: Dict[str, Path] = {}  # id → файл
+        self._tickets: Dict[str, Ticket] = {}  # id → тикет
+        # Активные тикеты по рангу приоритета: отсортированные (дедлайн, id)
+        # для range-запросов через bisect и тикеты без дедлайна.
+        self._by_due: List[List[Tuple[str, str]]] = [[] for _ in range(4)]
+        self._undated: List[Dict[str, Ticket]] = [{} for _ in range(4)]
+        self._done_count = 0
+        self._sorted: Optional[List[Ticket]] = None
+        self._sorted_keys: List[_Key] = []
+        self._sorted_by_status: Dict[str, List[Ticket]] = {}
+        # обратный индекс для /find: слово → id; отсортированный список слов
+        # для поиска по префиксу пересобирается, только когда меняется словарь
+        self._postings: Dict[str, set] = defaultdict(set)
+        self._terms: Optional[List[str]] = None
+
+    def batch(self):
+        return contextlib.nullcontext()
+
+    # ── Файлы ──
+
+    def file_stats(self) -> Dict[Path, Tuple[int, int]]:
+        return {fp: (e.mtime_ns, e.size) for fp, e in self._files.items()}
+
+    def file_stat(self, fp: Path) -> Optional[Tuple[int, int]]:
+        entry = self._files.get(fp)
+        return (entry.mtime_ns, entry.size) if entry else None
+
+    def put_file(self, fp: Path, entry: _FileEntry):
+        self.drop_file(fp)
+        self._files[fp] = entry
+        for tid in entry.lines:
+            self._locations[tid] = fp
+        for t in entry.tickets:
+            self._add(t)
+        self._sorted = None
+
+    def drop_file(self, fp: Path):
+        old = self._files.pop(fp, None)
+        if old is None:
+            return
+        for tid in old.lines:
+            if self._locations.get(tid) == fp:
+                del self._locations[tid]
+        for t in old.tickets:
+            self._remove(t)
+        self._sorted = None
+
+    def append_ticket(self, fp: Path, ticket: Ticket, prefix_len: int, st):
+        entry = self._files[fp]
+        entry.mtime_ns, entry.size = st.st_mtime_ns, st.st_size
+        entry.tickets.append(ticket)
+        entry.lines[ticket.id] = entry.newlines + prefix_len
+        entry.newlines += prefix_len + 2
+        self._locations[ticket.id] = fp
+        self._add(ticket)
+        self._sorted = None
+
+    def _add(self, t: Ticket):
+        old = self._tickets.get(t.id)
+        if old is not None:
+            self._remove(old)
+        self._tickets[t.id] = t
+        for term in _ticket_terms(t):
+            if term not in self._postings:
+                self._terms = None
+            self._postings[term].add(t.id)
+        if t.status == "done":
+            self._done_count += 1
+        if t.status != "todo":
+            return
+        rank = PRIORITY_ORDER.get(t.priority, 2)
+        if t.due_date:
+            bisect.insort(self._by_due[rank], (t.due_date, t.id))
+        else:
+            self._undated[rank][t.id] = t
+
+    def _remove(self, t: Ticket):
+        if self._tickets.get(t.id) is not t:
+            return
+        del self._tickets[t.id]
+        for term in _ticket_terms(t):
+            ids = self._postings.get(term)
+            if ids is not None:
+                ids.discard(t.id)
+                if not ids:
+                    del self._postings[term]
+                    self._terms = None
+        if t.status == "done":
+            self._done_count -= 1
+        if t.status != "todo":
+            return
+        rank = PRIORITY_ORDER.get(t.priority, 2)
+        if t.due_date:
+            lst, key = self._by_due[rank], (t.due_date, t.id)
+            i = bisect.bisect_left(lst, key)
+            if i < len(lst) and lst[i] == key:
+                del lst[i]
+        else:
+            self._undated[rank].pop(t.id, None)
+
+    # ── Поиск ──
+
+    def location(self, tid: str) -> Optional[Tuple[Path, int]]:
+        fp = self._locations.get(tid)
+        return (fp, self._files[fp].lines[tid]) if fp else None
+
+    def line_in_file(self, fp: Path, tid: str) -> Optional[int]:
+        entry = self._files.get(fp)
+        return entry.lines.get(tid) if entry else None
+
+    def get(self, tid: str) -> Optional[Ticket]:
+        return self._tickets.get(tid)
+
+    def scan(self) -> List[Ticket]:
+        return [t for fp in sorted(self._files) for t in self._files[fp].tickets]
+
+    def file_tickets(self, status: str) -> Dict[Path, List[Ticket]]:
+        return {
+            fp: ts
+            for fp, e in self._files.items()
+            if (ts := [t for t in e.tickets if t.status == status])
+        }
+
+    def search(self, words: List[str]) -> List[Ticket]:
+        """Тикеты, где каждое слово запроса — начало какого-то слова тикета."""
+        if self._terms is None:
+            self._terms = sorted(self._postings)
+        found: Optional[set] = None
+        # длинные слова обычно реже — пересечение быстрее сужается
+        for word in sorted(words, key=len, reverse=True):
+            ids = set()
+            i = bisect.bisect_left(self._terms, word)
+            while i < len(self._terms) and self._terms[i].startswith(word):
+                ids |= self._postings[self._terms[i]]
+                i += 1
+            found = ids if found is None else found & ids
+            if not found:
+                return []
+        tickets = [self._tickets[tid] for tid in found or ()]
+        return sorted(tickets, key=lambda t: (t.status != "todo", _sort_key(t)))
+
+    # ── Выборки ──
+
+    def _due_range(
+        self, rank: int, start: Optional[str], end: Optional[str]
+    ) -> List[Ticket]:
+        """Активные тикеты ранга rank с дедлайном в [start, end)."""
+        lst = self._by_due[rank]
+        i = bisect.bisect_left(lst, (start,)) if start else 0
+        j = bisect.bisect_left(lst, (end,)) if end else len(lst)
+        return [self._tickets[tid] for _, tid in lst[i:j]]
+
+    def _ensure_sorted(self) -> List[Ticket]:
+        if self._sorted is None:
+            self._sorted = sorted(self._tickets.values(), key=_sort_key)
+            self._sorted_keys = [_sort_key(t) for t in self._sorted]
+            self._sorted_by_status = defaultdict(list)
+            for t in self._sorted:
+                self._sorted_by_status[t.status].append(t)
+        return self._sorted
+
+    def sorted_tickets(self, status: Optional[str] = None) -> List[Ticket]:
+        self._ensure_sorted()
+        if status:
+            return list(self._sorted_by_status.get(status, ()))
+        return list(self._sorted)
+
+    def due_tickets(self, start: Optional[str], end: Optional[str]) -> List[Ticket]:
+        return [t for r in range(4) for t in self._due_range(r, start, end)]
+
+    def page(
+        self,
+        status: Optional[str],
+        start: Optional[str],
+        end: Optional[str],
+        priority: Optional[str],
+        after: Optional[_Key],
+        limit: int,
+    ) -> List[Ticket]:
+        """До limit тикетов по фильтрам, строго после ключа after."""
+        if status == "todo":
+            ranks = [PRIORITY_ORDER.get(priority, 2)] if priority else range(4)
+            out: List[Ticket] = []
+            for r in ranks:
+                if after and r < after[0]:
+                    continue
+                cursor = after[1:] if after and r == after[0] else None
+                out += self._active_page(
+                    r, start, end, priority, cursor, limit - len(out)
+                )
+                if len(out) >= limit:
+                    break
+            return out
+
+        tickets, keys = self._ensure_sorted(), self._sorted_keys
+        i = bisect.bisect_right(keys, after) if after else 0
+        out = []
+        while i < len(tickets) and len(out) < limit:
+            t = tickets[i]
+            i += 1
+            if status and t.status != status or priority and t.priority != priority:
+                continue
+            if _due_match(t, start, end):
+                out.append(t)
+        return out
+
+    def window(
+        self, status: Optional[str], offset: int, limit: int
+    ) -> Tuple[List[Ticket], int]:
+        """Срез [offset, offset + limit) упорядоченной выборки и её размер."""
+        if status == "todo":
+            return self._active_window(offset, limit)
+        self._ensure_sorted()
+        tickets = self._sorted_by_status.get(status, []) if status else self._sorted
+        return tickets[offset : offset + limit], len(tickets)
+
+    def _active_window(self, offset: int, limit: int) -> Tuple[List[Ticket], int]:
+        """Размеры рангов известны, поэтому до offset доходим без перебора тикетов."""
+        out: List[Ticket] = []
+        total = 0
+        for r in range(4):
+            dated, undated = self._by_due[r], self._undated[r]
+            lo = max(0, offset - total)
+            hi = min(len(dated) + len(undated), offset + limit - total)
+            if lo < hi:
+                out += [self._tickets[tid] for _, tid in dated[lo:hi]]
+                if hi > len(dated):
+                    ids = sorted(undated)[max(0, lo - len(dated)) : hi - len(dated)]
+                    out += [undated[tid] for tid in ids]
+            total += len(dated) + len(undated)
+        return out, total
+
+    def _active_page(
+        self,
+        rank: int,
+        start: Optional[str],
+        end: Optional[str],
+        priority: Optional[str],
+        cursor: Optional[Tuple[str, str]],
+        limit: int,
+    ) -> List[Ticket]:
+        """Страница активных тикетов одного ранга: сначала по дедлайну, потом без него."""
+        lst = self._by_due[rank]
+        i = bisect.bisect_left(lst, (start,)) if start else 0
+        if cursor:
+            i = max(i, bisect.bisect_right(lst, cursor))
+        j = bisect.bisect_left(lst, (end,)) if end else len(lst)
+        out = []
+        while i < j and len(out) < limit:
+            t = self._tickets[lst[i][1]]
+            i += 1
+            if not priority or t.priority == priority:
+                out.append(t)
+        if start or end or len(out) >= limit:
+            return out
+
+        # без дедлайна — в конце ранга, по id (ключ ("9999", id))
+        undated = sorted(
+            tid
+            for tid, t in self._undated[rank].items()
+            if (not cursor or ("9999", tid) > cursor)
+            and (not priority or t.priority == priority)
+        )
+        return out + [self._undated[rank][tid] for tid in undated[: limit - len(out)]]
+
+    def _undated_sorted(self, rank: int) -> List[Ticket]:
+        """Без дедлайна — по id, как в _active_window и в _SqliteIndex."""
+        undated = self._undated[rank]
+        return [undated[tid] for tid in sorted(undated)]
+
+    def active_tickets(self, due_before: Optional[str] = None) -> List[Ticket]:
+        """Активные: с дедлайном раньше due_before (None — любым) и без дедлайна."""
+        return [
+            t
+            for r in range(4)
+            for t in (
+                *self._due_range(r, None, due_before),
+                *self._undated_sorted(r),
+            )
+        ]
+
+    def snapshot(self, today: str, tomorrow: str) -> TicketSnapshot:
+        snap = TicketSnapshot(done_count=self._done_count)
+        for r in range(4):
+            overdue = self._due_range(r, None, today)
+            due_today = self._due_range(r, today, tomorrow)
+            later = self._due_range(r, tomorrow, None)
+            undated = self._undated_sorted(r)
+            snap.overdue += overdue
+            snap.due_today += due_today
+            snap.undated += undated
+            snap.today += due_today + undated
+            snap.active += overdue + due_today + later + undated
+        return snap
+
+
+class _SqliteIndex:
+    """
+    Зеркало индекса в SQLite. Markdown-файлы остаются источником истины,
+    база лишь помнит, какой файл при каком mtime/size во что распарсился, —
+    после рестарта перечитываются только изменённые файлы, а выборки
+    идут индексированным SQL.
+    """
+
+    _VERSION = 3
+    _COLS = "id, title, status, priority, due, done, tags, description, created"
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS files (
+            path TEXT PRIMARY KEY,
+            mtime_ns INTEGER NOT NULL,
+            size INTEGER NOT NULL,
+            newlines INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS tickets (
+            id TEXT PRIMARY KEY,
+            file TEXT NOT NULL,
+            line INTEGER NOT NULL,
+            title TEXT NOT NULL,
+            status TEXT NOT NULL,
+            priority TEXT NOT NULL,
+            prank INTEGER NOT NULL,
+            due TEXT,
+            done TEXT,
+            tags TEXT NOT NULL DEFAULT '',
+            description TEXT NOT NULL DEFAULT '',
+            created TEXT NOT NULL DEFAULT '',
+            -- ключ сортировки: тикеты без дедлайна — в конце ранга
+            dkey TEXT AS (COALESCE(due, '9999'))
+        );
+        CREATE INDEX IF NOT EXISTS tickets_file ON tickets (file);
+        CREATE INDEX IF NOT EXISTS tickets_active ON tickets (status, prank, due);
+        CREATE INDEX IF NOT EXISTS tickets_order ON tickets (status, prank, dkey, id);
+        CREATE INDEX IF NOT EXISTS tickets_all ON tickets (prank, dkey, id);
+        CREATE TABLE IF NOT EXISTS terms (
+            term TEXT NOT NULL,
+            id TEXT NOT NULL,
+            PRIMARY KEY (term, id)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS terms_id ON terms (id);
+    """
+
+    def __init__(self, db_path: str):
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        # доступ сериализован RLock-ом ObsidianVault
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        if self._db.execute("PRAGMA user_version").fetchone()[0] != self._VERSION:
+            # зеркало всегда можно пересобрать из .md — просто начинаем с нуля
+            self._db.executescript(
+                "DROP TABLE IF EXISTS files; DROP TABLE IF EXISTS tickets; "
+                "DROP TABLE IF EXISTS terms;"
+            )
+            self._db.execute(f"PRAGMA user_version = {self._VERSION}")
+        self._db.executescript(self._SCHEMA)
+        self._in_batch = False
+
+    @contextlib.contextmanager
+    def batch(self):
+        """Один транзакционный коммит на пачку изменений (например, на весь рескан)."""
+        if self._in_batch:
+            yield
+            return
+        self._in_batch = True
+        try:
+            yield
+            self._db.commit()
+        except BaseException:
+            self._db.rollback()
+            raise
+        finally:
+            self._in_batch = False
+
+    def _commit(self):
+        if not self._in_batch:
+            self._db.commit()
+
+    @staticmethod
+    def _ticket(row) -> Ticket:
+        return Ticket(
+            id=row[0],
+            title=row[1],
+            status=row[2],
+            priority=row[3],
+            due_date=row[4],
+            done_date=row[5],
+            tags=tuple(row[6].split(",")) if row[6] else (),
+            description=row[7],
+            created=row[8],
+        )
+
+    def _query(
+        self,
+        where: str = "",
+        params=(),
+        order: str = "",
+        limit: int = 0,
+        offset: int = 0,
+    ) -> List[Ticket]:
+        sql = f"SELECT {self._COLS} FROM tickets"
+        if where:
+            sql += f" WHERE {where}"
+        if order:
+            sql += f" ORDER BY {order}"
+        if limit:
+            sql += f" LIMIT {int(limit)} OFFSET {int(offset)}"
+        return [self._ticket(r) for r in self._db.execute(sql, params)]
+
+    def _insert(self, fp: Path, line: int, t: Ticket):
+        self._db.execute("DELETE FROM terms WHERE id = ?", (t.id,))
+        self._db.executemany(
+            "INSERT INTO terms (term, id) VALUES (?, ?)",
+            ((term, t.id) for term in _ticket_terms(t)),
+        )
+        self._db.execute(
+            "INSERT OR REPLACE INTO tickets "
+            "(id, file, line, title, status, priority, prank, due, done, "
+            "tags, description, created) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                t.id,
+                str(fp),
+                line,
+                t.title,
+                t.status,
+                t.priority,
+                PRIORITY_ORDER.get(t.priority, 2),
+                t.due_date,
+                t.done_date,
+                ",".join(t.tags),
+                t.description,
+                t.created,
+            ),
+        )
+
+    # ── Файлы ──
+
+    def file_stats(self) -> Dict[Path, Tuple[int, int]]:
+        rows = self._db.execute("SELECT path, mtime_ns, size FROM files")
+        return {Path(p): (m, s) for p, m, s in rows}
+
+    def file_stat(self, fp: Path) -> Optional[Tuple[int, int]]:
+        row = self._db.execute(
+            "SELECT mtime_ns, size FROM files WHERE path = ?", (str(fp),)
+        ).fetchone()
+        return tuple(row) if row else None
+
+    def _delete_file_tickets(self, fp: Path):
+        self._db.execute(
+            "DELETE FROM terms WHERE id IN (SELECT id FROM tickets WHERE file = ?)",
+            (str(fp),),
+        )
+        self._db.execute("DELETE FROM tickets WHERE file = ?", (str(fp),))
+
+    def put_file(self, fp: Path, entry: _FileEntry):
+        self._delete_file_tickets(fp)
+        self._db.execute(
+            "INSERT OR REPLACE INTO files (path, mtime_ns, size, newlines) "
+            "VALUES (?, ?, ?, ?)",
+            (str(fp), entry.mtime_ns, entry.size, entry.newlines),
+        )
+        for t in entry.tickets:
+            self._insert(fp, entry.lines[t.id], t)
+        self._commit()
+
+    def drop_file(self, fp: Path):
+        self._delete_file_tickets(fp)
+        self._db.execute("DELETE FROM files WHERE path = ?", (str(fp),))
+        self._commit()
+
+    def append_ticket(self, fp: Path, ticket: Ticket, prefix_len: int, st):
+        (newlines,) = self._db.execute(
+            "SELECT newlines FROM files WHERE path = ?", (str(fp),)
+        ).fetchone()
+        self._db.execute(
+            "UPDATE files SET mtime_ns = ?, size = ?, newlines = ? WHERE path = ?",
+            (st.st_mtime_ns, st.st_size, newlines + prefix_len + 2, str(fp)),
+        )
+        self._insert(fp, newlines + prefix_len, ticket)
+        self._commit()
+
+    # ── Поиск ──
+
+    def location(self, tid: str) -> Optional[Tuple[Path, int]]:
+        row = self._db.execute(
+            "SELECT file, line FROM tickets WHERE id = ?", (tid,)
+        ).fetchone()
+        return (Path(row[0]), row[1]) if row else None
+
+    def line_in_file(self, fp: Path, tid: str) -> Optional[int]:
+        row = self._db.execute(
+            "SELECT line FROM tickets WHERE id = ? AND file = ?", (tid, str(fp))
+        ).fetchone()
+        return row[0] if row else None
+
+    def get(self, tid: str) -> Optional[Ticket]:
+        found = self._query("id = ?", (tid,))
+        return found[0] if found else None
+
+    def scan(self) -> List[Ticket]:
+        return self._query(order="file, line")
+
+    def file_tickets(self, status: str) -> Dict[Path, List[Ticket]]:
+        out: Dict[Path, List[Ticket]] = defaultdict(list)
+        sql = f"SELECT file, {self._COLS} FROM tickets WHERE status = ?"
+        for row in self._db.execute(sql, (status,)):
+            out[Path(row[0])].append(self._ticket(row[1:]))
+        return out
+
+    def search(self, words: List[str]) -> List[Ticket]:
+        # слово запроса — префикс слова тикета: диапазон по первичному ключу terms
+        sub = " INTERSECT ".join(
+            ["SELECT id FROM terms WHERE term >= ? AND term < ?"] * len(words)
+        )
+        params = [p for w in words for p in (w, w + "\U0010ffff")]
+        return self._query(f"id IN ({sub})", params, f"status != 'todo', {self._ORDER}")
+
+    # ── Выборки ──
+
+    _ORDER = "prank, dkey, id"
+
+    def sorted_tickets(self, status: Optional[str] = None) -> List[Ticket]:
+        if status:
+            return self._query("status = ?", (status,), self._ORDER)
+        return self._query(order=self._ORDER)
+
+    def window(
+        self, status: Optional[str], offset: int, limit: int
+    ) -> Tuple[List[Ticket], int]:
+        where, params = ("status = ?", (status,)) if status else ("", ())
+        sql = "SELECT COUNT(*) FROM tickets" + (f" WHERE {where}" if where else "")
+        (total,) = self._db.execute(sql, params).fetchone()
+        return self._query(where, params, self._ORDER, limit, offset), total
+
+    def page(
+        self,
+        status: Optional[str],
+        start: Optional[str],
+        end: Optional[str],
+        priority: Optional[str],
+        after: Optional[_Key],
+        limit: int,
+    ) -> List[Ticket]:
+        """До limit тикетов по фильтрам, строго после ключа after (keyset-пагинация)."""
+        where, params = [], []
+        if status:
+            where.append("status = ?")
+            params.append(status)
+        if priority:
+            rank = PRIORITY_ORDER.get(priority, 2)
+            if after and after[0] > rank:
+                return []
+            if after and after[0] < rank:
+                after = None
+            where += ["prank = ?", "priority = ?"]
+            params += [rank, priority]
+        if start:
+            where.append("due >= ?")
+            params.append(start)
+        if end:
+            where.append("due < ?")
+            params.append(end)
+        if after and priority:
+            # ранг зафиксирован — курсор по (dkey, id), чтобы индекс не сортировал
+            where.append("(dkey, id) > (?, ?)")
+            params += after[1:]
+        elif after:
+            where.append(f"({self._ORDER}) > (?, ?, ?)")
+            params += after
+        return self._query(" AND ".join(where), params, self._ORDER, limit)
+
+    def due_tickets(self, start: Optional[str], end: Optional[str]) -> List[Ticket]:
+        where, params = "status = 'todo' AND due IS NOT NULL", []
+        if start:
+            where += " AND due >= ?"
+            params.append(start)
+        if end:
+            where += " AND due < ?"
+            params.append(end)
+        return self._query(where, params, "prank, due, id")
+
+    def active_tickets(self, due_before: Optional[str] = None) -> List[Ticket]:
+        where, params = "status = 'todo'", []
+        if due_before:
+            where += " AND (due IS NULL OR due < ?)"
+            params.append(due_before)
+        return self._query(where, params, "prank, due IS NULL, due, id")
+
+    def snapshot(self, today: str, tomorrow: str) -> TicketSnapshot:
+        (done_count,) = self._db.execute(
+            "SELECT COUNT(*) FROM tickets WHERE status = 'done'"
+        ).fetchone()
+        snap = TicketSnapshot(done_count=done_count)
+        for t in self.active_tickets():
+            snap.active.append(t)
+            if not t.due_date:
+                snap.undated.append(t)
+                snap.today.append(t)
+            elif t.due_date < today:
+                snap.overdue.append(t)
+            elif t.due_date < tomorrow:
+                snap.due_today.append(t)
+                snap.today.append(t)
+        return snap
+
+
+class _StaleIndex(Exception):
+    """Файл поменяли между поиском тикета в индексе и его правкой."""
+
+
 class ObsidianVault:
+    # Файлы читаются построчно кусками не длиннее _MAX_LINE символов:
+    # память не зависит от размера заметки, а сверхдлинные строки
+    # (не задачи) проходят насквозь фрагментами.
+    _MAX_LINE = 1 << 16
     _RE_TASK = re.compile(r"^\s*-\s+\[([ xX])\]\s+(.*)")
-    _RE_META = re.compile(r"%%id:(T-[\w-]+)(?:\s+p:(\w+))?%%")
-    _RE_DUE = re.compile(r"📅\s*(\d{4}-\d{2}-\d{2})")
-    _RE_DONE = re.compile(r"✅\s*(\d{4}-\d{2}-\d{2})")
+    _RE_META = re.compile(
+        r"%%id:(T-[\w-]+)(?:\s+p:(\w+))?(?:\s+tags:(\S+))?(?:\s+desc:(.*?))?%%"
+    )
+    # 📅 дедлайн и ✅ дата закрытия — снимаются с заголовка за один проход
+    _RE_MARKER = re.compile(r"\s*(📅|✅)\s*(\d{4}-\d{2}-\d{2})")
+    _RE_SPACES = re.compile(r"\s{2,}")
+    _RE_ID_DATE = re.compile(r"^T-(\d{2})(\d{2})(\d{2})-")
 
-    def __init__(self, vault_path: str, inbox_dir: str = "Входящие"):
+    def __init__(
+        self,
+        vault_path: str,
+        inbox_dir: str = "Входящие",
+        rescan_interval: float = 2.0,
+        archive_dir: str = "Архив",
+        index_db: Optional[str] = None,
+    ):
         self.vault_path = Path(vault_path)
         self.inbox_path = self.vault_path / inbox_dir
         self.inbox_path.mkdir(parents=True, exist_ok=True)
+        # Холодное хранилище: закрытые тикеты по месяцам, вне инбокса
+        self.archive_path = self.vault_path / archive_dir
+        self._archive_files: Dict[Path, _FileEntry] = {}
+
+        # Индекс тикетов: файл → распарсенное содержимое.
+        # Перечитываем только файлы, у которых изменились mtime/size.
+        # С index_db индекс живёт в SQLite и переживает рестарты.
+        self.rescan_interval = rescan_interval
+        self._index = _SqliteIndex(index_db) if index_db else _MemoryIndex()
+        self._last_scan = 0.0
+        # индекс читают и обновляют из потоков AsyncObsidianVault
+        self._lock = threading.RLock()
+        # Файлы, записанные ботом с прошлой синхронизации: sync может отправить
+        # только их, не обходя дерево. Свой лок — берётся из event loop.
+        self._dirty: set = set()
+        self._dirty_lock = threading.Lock()
+
+    def _touch(self, *paths: Path):
+        with self._dirty_lock:
+            self._dirty.update(paths)
+
+    def take_dirty_paths(self) -> set:
+        """Файлы (в т.ч. удалённые), изменённые ботом с прошлого вызова."""
+        with self._dirty_lock:
+            dirty, self._dirty = self._dirty, set()
+        return dirty
 
     def _daily_path(self, dt: Optional[date] = None) -> Path:
         return self.inbox_path / f"{(dt or date.today()).isoformat()}.md"
 
-    def _ensure_daily(self, dt: Optional[date] = None) -> Path:
-        path = self._daily_path(dt)
-        if not path.exists():
-            path.touch()
-        return path
+    @staticmethod
+    def _append(fp: Path, text: str) -> Tuple[os.stat_result, os.stat_result, str]:
+        """
+        Дописывает text в конец файла одним write() через O_APPEND + fsync.
+        При падении процесса старое содержимое файла не повреждается.
+        Возвращает stat до и после записи и добавленный перевод строки (если был нужен).
+        """
+        fd = os.open(fp, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            st_before = os.fstat(fd)
+            prefix = ""
+            if st_before.st_size and os.pread(fd, 1, st_before.st_size - 1) != b"\n":
+                prefix = "\n"
+            data = (prefix + text).encode("utf-8")
+            written = 0
+            while written < len(data):
+                written += os.write(fd, data[written:])
+            os.fsync(fd)
+            return st_before, os.fstat(fd), prefix
+        finally:
+            os.close(fd)
 
-    def _parse_task_at(self, lines: List[str], i: int) -> Optional[dict]:
-        m = self._RE_TASK.match(lines[i])
-        if not m:
-            return None
+    @classmethod
+    def _atomic_write(cls, fp: Path, text: str):
+        with cls._atomic_file(fp) as f:
+            f.write(text)
+
+    @staticmethod
+    @contextlib.contextmanager
+    def _atomic_file(fp: Path):
+        """
+        Отдаёт временный файл рядом с fp; на выходе — fsync и атомарная подмена fp
+        через rename. Исключение внутри блока удаляет временный файл, fp не трогается.
+        """
+        tmp = fp.with_name(f".{fp.name}.{uuid.uuid4().hex[:8]}.tmp")
+        try:
+            with open(tmp, "w", encoding="utf-8", newline="") as f:
+                yield f
+                f.flush()
+                os.fsync(f.fileno())
+            try:
+                os.chmod(tmp, fp.stat().st_mode)
+            except FileNotFoundError:
+                pass
+            os.replace(tmp, fp)
+        except BaseException:
+            tmp.unlink(missing_ok=True)
+            raise
+
+        # fsync каталога, чтобы сам rename пережил падение
+        try:
+            dir_fd = os.open(fp.parent, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(dir_fd)
+        except OSError:
+            pass
+        finally:
+            os.close(dir_fd)
 
-        if i + 1 >= len(lines):
+    def _parse_pair(self, line: str, meta_line: str) -> Optional[Ticket]:
+        """Строка задачи + строка меты → Ticket, без промежуточных dict."""
+        m = self._RE_TASK.match(line)
+        if not m:
             return None
-        meta_m = self._RE_META.search(lines[i + 1])
+        meta_m = self._RE_META.search(meta_line)
         if not meta_m:
             return None
 
-        done = m.group(1).lower() == "x"
         body = m.group(2)
-        due_m = self._RE_DUE.search(body)
+        dates = {}
+        if "📅" in body or "✅" in body:
+
+            def take(mm):
+                dates.setdefault(mm.group(1), mm.group(2))
+                return ""
 
-        title = body
-        for rx in (self._RE_DUE, self._RE_DONE):
-            title = rx.sub("", title)
-        title = re.sub(r"\s{2,}", " ", title).strip()
+            body = self._RE_MARKER.sub(take, body)
 
-        return dict(
+        return Ticket(
             id=meta_m.group(1),
-            title=title,
-            done=done,
+            title=self._RE_SPACES.sub(" ", body).strip(),
+            status="done" if m.group(1) in "xX" else "todo",
             priority=meta_m.group(2) or "medium",
-            due_date=due_m.group(1) if due_m else None,
+            due_date=dates.get("📅"),
+            done_date=dates.get("✅"),
+            description=meta_m.group(4) or "",
+            tags=tuple(meta_m.group(3).split(",")) if meta_m.group(3) else (),
         )
 
-    def _scan_all(self) -> List[Ticket]:
+    def _id_daily_path(self, tid: str) -> Optional[Path]:
+        """T-yymmdd-xxxx создаётся в дневном файле за yymmdd."""
+        m = self._RE_ID_DATE.match(tid)
+        if not m:
+            return None
+        try:
+            dt = date(2000 + int(m.group(1)), int(m.group(2)), int(m.group(3)))
+        except ValueError:
+            return None
+        return self._daily_path(dt)
+
+    @classmethod
+    def _read_pieces(cls, f) -> Iterator[str]:
+        """Строки файла вместе с "\n"; строка длиннее _MAX_LINE приходит частями."""
+        return iter(functools.partial(f.readline, cls._MAX_LINE), "")
+
+    def _scan(self, pieces: Iterable[str]) -> Tuple[List[Ticket], Dict[str, int], int]:
+        """
+        Потоковый разбор: держит в памяти только предыдущую строку.
+        Номер строки — число "\n" перед ней. Возвращает тикеты, их строки и число "\n".
+        """
         tickets: List[Ticket] = []
-        for fp in sorted(self.inbox_path.glob("*.md")):
-            lines = fp.read_text(encoding="utf-8").split("\n")
-            i = 0
-            while i < len(lines):
-                info = self._parse_task_at(lines, i)
-                if info:
-                    tickets.append(
-                        Ticket(
-                            id=info["id"],
-                            title=info["title"],
-                            status="done" if info["done"] else "todo",
-                            priority=info["priority"],
-                            due_date=info["due_date"],
-                        )
-                    )
-                    i += 2  # задача + мета
+        positions: Dict[str, int] = {}
+        newlines = 0
+        prev: Optional[Tuple[int, str]] = None  # кандидат в строку задачи
+        whole = True  # кусок начинается с начала строки
+        for piece in pieces:
+            ends = piece.endswith("\n")
+            if whole and (ends or len(piece) < self._MAX_LINE):
+                text = piece[:-1] if ends else piece
+                ticket = prev and self._parse_pair(prev[1], text)
+                if ticket:
+                    tickets.append(ticket)
+                    positions[ticket.id] = prev[0]
+                    prev = None  # задача + мета
                 else:
-                    i += 1
-        return tickets
+                    prev = (newlines, text)
+            else:
+                prev = None  # фрагмент сверхдлинной строки — не задача
+            whole = ends
+            newlines += ends
+        return tickets, positions, newlines
+
+    def _parse_lines(self, lines: List[str]) -> Tuple[List[Ticket], Dict[str, int]]:
+        tickets, positions, _ = self._scan(line + "\n" for line in lines)
+        return tickets, positions
+
+    def _parse_file(self, fp: Path) -> Tuple[List[Ticket], Dict[str, int], int]:
+        with open(fp, encoding="utf-8", newline="\n") as f:
+            return self._scan(self._read_pieces(f))
+
+    def _is_fresh(self, fp: Path, st) -> bool:
+        return self._index.file_stat(fp) == (st.st_mtime_ns, st.st_size)
+
+    def _reindex_file(self, fp: Path) -> Optional[_FileEntry]:
+        """Перечитывает один файл и кладёт его в индекс (или убирает, если файла нет)."""
+        with self._lock:
+            try:
+                st = fp.stat()
+                tickets, positions, newlines = self._parse_file(fp)
+            except FileNotFoundError:
+                self._index.drop_file(fp)
+                return None
+            entry = _FileEntry(st.st_mtime_ns, st.st_size, tickets, positions, newlines)
+            self._index.put_file(fp, entry)
+            return entry
+
+    def _index_lines(self, fp: Path, lines: List[str]):
+        """Индексирует только что записанный файл по его строкам, без перечитывания."""
+        tickets, positions = self._parse_lines(lines)
+        st = fp.stat()
+        with self._lock:
+            self._index.put_file(
+                fp,
+                _FileEntry(
+                    st.st_mtime_ns, st.st_size, tickets, positions, len(lines) - 1
+                ),
+            )
+
+    def _ensure_fresh(self, fp: Path) -> bool:
+        """Актуализирует запись индекса для файла; False, если файла нет."""
+        with self._lock:
+            try:
+                st = fp.stat()
+            except FileNotFoundError:
+                self._index.drop_file(fp)
+                return False
+            if not self._is_fresh(fp, st):
+                self._reindex_file(fp)
+            return True
+
+    def _locate(self, tid: str) -> Optional[Tuple[Path, int]]:
+        """Файл и строка тикета: индекс → файл по дате из ID → полный пересчёт."""
+        return self._locate_many([tid])[tid]
+
+    def _locate_quick(self, tid: str) -> Optional[Tuple[Path, int]]:
+        """Поиск без полного пересчёта: по индексу и по дате из ID."""
+        loc = self._index.location(tid)
+        candidates = [loc[0] if loc else None, self._id_daily_path(tid)]
+        for fp in dict.fromkeys(c for c in candidates if c):
+            if self._ensure_fresh(fp):
+                line = self._index.line_in_file(fp, tid)
+                if line is not None:
+                    return fp, line
+        return None
+
+    def _locate_many(
+        self, tids: Iterable[str]
+    ) -> Dict[str, Optional[Tuple[Path, int]]]:
+        """
+        Как _locate для пачки ID: полный пересчёт — не больше одного на всю
+        пачку, ненайденные после него считаются отсутствующими.
+        """
+        with self._lock:
+            found = {tid: self._locate_quick(tid) for tid in tids}
+            missing = [tid for tid, loc in found.items() if loc is None]
+            if missing:
+                self._refresh(force=True)
+                for tid in missing:
+                    found[tid] = self._index.location(tid)
+            return found
+
+    def _refresh(self, force: bool = False):
+        """Сверяет индекс с диском: новые/изменённые файлы парсятся, удалённые выкидываются."""
+        with self._lock:
+            now = time.monotonic()
+            if not force and now - self._last_scan < self.rescan_interval:
+                return
+
+            with self._index.batch():
+                known = self._index.file_stats()
+                seen = set()
+                for fp in self.inbox_path.glob("*.md"):
+                    try:
+                        st = fp.stat()
+                    except FileNotFoundError:
+                        continue
+                    seen.add(fp)
+                    if known.get(fp) != (st.st_mtime_ns, st.st_size):
+                        self._reindex_file(fp)
+
+                for fp in known:
+                    if fp not in seen:
+                        self._index.drop_file(fp)
+
+            self._last_scan = now
+
+    def _scan_all(self) -> List[Ticket]:
+        with self._lock:
+            self._refresh()
+            return self._index.scan()
+
+    def iter_tickets(
+        self,
+        status: Optional[str] = None,
+        due_from: Optional[str] = None,
+        due_to: Optional[str] = None,
+        priority: Optional[str] = None,
+        chunk: int = 256,
+    ) -> Iterator[Ticket]:
+        """
+        Тикеты по приоритету, дедлайну и id; фильтры (дедлайн в [due_from, due_to))
+        уходят в индекс. Индекс читается пачками по chunk под блокировкой,
+        между пачками позиция — ключ последнего тикета, так что параллельные
+        правки обход не ломают и полный список не собирается.
+        """
+        with self._lock:
+            self._refresh()
+        after = None
+        while True:
+            with self._lock:
+                page = self._index.page(
+                    status, due_from, due_to, priority, after, chunk
+                )
+            if not page:
+                return
+            after = _sort_key(page[-1])
+            yield from page
+            if len(page) < chunk:
+                return
 
     # ── CRUD ──
 
@@ -125,80 +1075,247 @@ class ObsidianVault:
         due_date: Optional[str] = None,
         tags: Optional[List[str]] = None,
     ) -> Ticket:
-        tid = f"T-{datetime.now().strftime('%y%m%d')}-{uuid.uuid4().hex[:4]}"
+        now = datetime.now()
+        tid = f"T-{now.strftime('%y%m%d')}-{uuid.uuid4().hex[:4]}"
+        created = now.isoformat(timespec="seconds")
+        description, tags = _meta_fields(description, tags or ())
         ticket = Ticket(
             id=tid,
             title=title,
             description=description,
             priority=priority,
             due_date=due_date or date.today().isoformat(),
-            tags=tags or [],
+            created=created,
+            updated=created,
+            tags=tags,
+        )
+
+        fp = self._daily_path()
+        st_before, st_after, prefix = self._append(
+            fp, ticket.to_task_line() + "\n" + ticket.to_meta_line() + "\n"
         )
+        self._touch(fp)
 
-        fp = self._ensure_daily()
-        content = fp.read_text(encoding="utf-8")
-        if content and not content.endswith("\n"):
-            content += "\n"
-        content += ticket.to_task_line() + "\n"
-        content += ticket.to_meta_line() + "\n"
-        fp.write_text(content, encoding="utf-8")
+        # Если индекс файла был актуален — дописываем тикет без перепарсинга
+        with self._lock:
+            if self._is_fresh(fp, st_before):
+                self._index.append_ticket(fp, ticket, len(prefix), st_after)
+            else:
+                self._reindex_file(fp)
 
         logger.info("Created ticket %s: %s", tid, title)
         return ticket
 
     def get_all_tickets(self, status: Optional[str] = None) -> List[Ticket]:
-        ts = self._scan_all()
-        if status:
-            ts = [t for t in ts if t.status == status]
-        order = {"critical": 0, "high": 1, "medium": 2, "low": 3}
-        ts.sort(key=lambda t: (order.get(t.priority, 2), t.due_date or "9999"))
-        return ts
+        if status == "todo":
+            return self.get_active_tickets()
+        with self._lock:
+            self._refresh()
+            return self._index.sorted_tickets(status)
+
+    def get_tickets_page(
+        self,
+        status: Optional[str] = None,
+        offset: int = 0,
+        limit: int = 10,
+        archived: bool = False,
+    ) -> Tuple[List[Ticket], int]:
+        """
+        Страница выборки (приоритет → дедлайн → id) и её полный размер.
+        Собирается только сама страница. С archived=True за тикетами
+        инбокса продолжаются тикеты из архива.
+        """
+        with self._lock:
+            self._refresh()
+            page, total = self._index.window(status, offset, limit)
+        if archived:
+            arch = self.get_archived_tickets()
+            start = max(0, offset - total)
+            page += arch[start : start + limit - len(page)]
+            total += len(arch)
+        return page, total
+
+    def search_tickets(self, query: str) -> List[Ticket]:
+        """
+        Поиск по заголовкам, описаниям и тегам: каждое слово запроса должно
+        быть началом слова тикета. Активные первыми. Работает по обратному
+        индексу — время зависит от числа совпадений, а не от размера vault.
+        """
+        words = list(dict.fromkeys(_tokens(query)))
+        if not words:
+            return []
+        with self._lock:
+            self._refresh()
+            return self._index.search(words)
+
+    def get_due_tickets(
+        self, start: Optional[str] = None, end: Optional[str] = None
+    ) -> List[Ticket]:
+        """Активные тикеты с дедлайном в [start, end), по приоритету и дедлайну."""
+        with self._lock:
+            self._refresh()
+            return self._index.due_tickets(start, end)
 
     def get_active_tickets(self) -> List[Ticket]:
-        return [t for t in self.get_all_tickets() if t.status == "todo"]
+        with self._lock:
+            self._refresh()
+            return self._index.active_tickets()
 
     def get_today_tickets(self) -> List[Ticket]:
-        today = date.today().isoformat()
-        return [
-            t
-            for t in self.get_active_tickets()
-            if not t.due_date or t.due_date <= today
-        ]
+        tomorrow = (date.today() + timedelta(days=1)).isoformat()
+        with self._lock:
+            self._refresh()
+            return self._index.active_tickets(due_before=tomorrow)
 
     def get_overdue_tickets(self) -> List[Ticket]:
-        today = date.today().isoformat()
-        return [
-            t for t in self.get_active_tickets() if t.due_date and t.due_date < today
-        ]
+        return self.get_due_tickets(end=date.today().isoformat())
 
-    def _mutate(self, tid: str, fn: Callable) -> bool:
-        for fp in self.inbox_path.glob("*.md"):
-            lines = fp.read_text(encoding="utf-8").split("\n")
-            for i in range(len(lines)):
-                info = self._parse_task_at(lines, i)
-                if not info or info["id"] != tid:
+    def get_upcoming_tickets(self, days: int = 7) -> List[Ticket]:
+        """Тикеты с дедлайном от сегодня и на days дней вперёд."""
+        today = date.today()
+        return self.get_due_tickets(
+            today.isoformat(), (today + timedelta(days=days)).isoformat()
+        )
+
+    def snapshot(self) -> TicketSnapshot:
+        """Все корзины из индекса по дедлайнам, без сортировки и полного прохода."""
+        today = date.today()
+        with self._lock:
+            self._refresh()
+            return self._index.snapshot(
+                today.isoformat(), (today + timedelta(days=1)).isoformat()
+            )
+
+    def _mutate_many(self, edits: Dict[str, Callable]) -> Dict[str, bool]:
+        """
+        Применяет правки к нескольким тикетам: fn(ticket, meta_line) → новые строки
+        вместо пары задача+мета. Тикеты группируются по файлам, каждый файл
+        переписывается одним потоковым проходом.
+        """
+        results = {tid: False for tid in edits}
+        by_file: Dict[Path, Dict[int, str]] = defaultdict(dict)
+        for tid, loc in self._locate_many(edits).items():
+            if loc:
+                by_file[loc[0]][loc[1]] = tid
+
+        for fp, targets in by_file.items():
+            if not self._rewrite(fp, targets, edits):
+                # файл поменяли между проверкой индекса и чтением — ищем заново
+                self._reindex_file(fp)
+                with self._lock:
+                    lines = (
+                        self._index.line_in_file(fp, tid) for tid in targets.values()
+                    )
+                    targets = {
+                        i: tid
+                        for i, tid in zip(lines, targets.values())
+                        if i is not None
+                    }
+                if not targets or not self._rewrite(fp, targets, edits):
                     continue
-                ticket = Ticket(
-                    id=info["id"],
-                    title=info["title"],
-                    status="done" if info["done"] else "todo",
-                    priority=info["priority"],
-                    due_date=info["due_date"],
-                )
-                fn(ticket, lines, i)
-                fp.write_text("\n".join(lines), encoding="utf-8")
-                return True
-        return False
+            for tid in targets.values():
+                results[tid] = True
+        return results
 
-    def update_status(self, ticket_id: str, new_status: str) -> bool:
-        def fn(t, lines, i):
+    def _rewrite(
+        self, fp: Path, targets: Dict[int, str], edits: Dict[str, Callable]
+    ) -> bool:
+        """
+        Копирует fp построчно во временный файл, применяя правки на строках targets,
+        и индексирует результат на лету. False — на этих строках не те тикеты.
+        """
+        try:
+            with open(fp, encoding="utf-8", newline="\n") as src:
+                with self._atomic_file(fp) as dst:
+                    tickets, positions, newlines = self._scan(
+                        self._tee(
+                            self._edited(self._read_pieces(src), targets, edits), dst
+                        )
+                    )
+        except (_StaleIndex, FileNotFoundError):
+            return False
+
+        self._touch(fp)
+        st = fp.stat()
+        with self._lock:
+            self._index.put_file(
+                fp, _FileEntry(st.st_mtime_ns, st.st_size, tickets, positions, newlines)
+            )
+        return True
+
+    def _edited(
+        self, pieces: Iterator[str], targets: Dict[int, str], edits: Dict[str, Callable]
+    ) -> Iterator[str]:
+        newlines, whole = 0, True
+        for piece in pieces:
+            tid = targets.get(newlines) if whole else None
+            if tid is None:
+                yield piece
+                whole = piece.endswith("\n")
+                newlines += whole
+                continue
+
+            meta = next(pieces, "")
+            ends = meta.endswith("\n")
+            ticket = (
+                piece.endswith("\n")
+                and (ends or len(meta) < self._MAX_LINE)
+                and self._parse_pair(piece[:-1], meta.rstrip("\n"))
+            )
+            if not ticket or ticket.id != tid:
+                raise _StaleIndex(tid)
+            new_lines = edits[tid](ticket, meta.rstrip("\n"))
+            for k, line in enumerate(new_lines, 1):
+                # последний перевод строки — как был у меты (его нет в конце файла)
+                yield line + ("\n" if k < len(new_lines) or ends else "")
+            newlines += 1 + ends
+
+    @staticmethod
+    def _tee(pieces: Iterable[str], f) -> Iterator[str]:
+        for piece in pieces:
+            f.write(piece)
+            yield piece
+
+    def _mutate(self, tid: str, fn: Callable) -> bool:
+        return self._mutate_many({tid: fn})[tid]
+
+    @staticmethod
+    def _status_edit(new_status: str) -> Callable:
+        def fn(t, meta_line):
             t.status = new_status
-            lines[i] = t.to_task_line()
+            return [t.to_task_line(), meta_line]
 
-        ok = self._mutate(ticket_id, fn)
-        if ok:
-            logger.info("Ticket %s → %s", ticket_id, new_status)
-        return ok
+        return fn
+
+    @staticmethod
+    def _update_edit(
+        priority: Optional[str] = None, due_date: Optional[str] = None
+    ) -> Callable:
+        def fn(t, meta_line):
+            if priority:
+                t.priority = priority
+            if due_date:
+                t.due_date = due_date
+            return [t.to_task_line(), t.to_meta_line()]
+
+        return fn
+
+    @staticmethod
+    def _delete_edit() -> Callable:
+        return lambda t, meta_line: []
+
+    def update_status(self, ticket_id: str, new_status: str) -> bool:
+        return self.update_statuses([ticket_id], new_status)[ticket_id]
+
+    def update_statuses(
+        self, ticket_ids: Iterable[str], new_status: str
+    ) -> Dict[str, bool]:
+        fn = self._status_edit(new_status)
+        results = self._mutate_many({tid: fn for tid in ticket_ids})
+        for tid, ok in results.items():
+            if ok:
+                logger.info("Ticket %s → %s", tid, new_status)
+        return results
 
     def update_ticket(
         self,
@@ -207,31 +1324,138 @@ class ObsidianVault:
         due_date: Optional[str] = None,
         description: Optional[str] = None,
     ) -> bool:
-        def fn(t, lines, i):
-            if priority:
-                t.priority = priority
-            if due_date:
-                t.due_date = due_date
-            lines[i] = t.to_task_line()
-            if i + 1 < len(lines) and self._RE_META.search(lines[i + 1]):
-                lines[i + 1] = t.to_meta_line()
+        return self._mutate(ticket_id, self._update_edit(priority, due_date))
 
-        return self._mutate(ticket_id, fn)
+    def reschedule_tickets(
+        self, ticket_ids: Iterable[str], due_date: str
+    ) -> Dict[str, bool]:
+        fn = self._update_edit(due_date=due_date)
+        results = self._mutate_many({tid: fn for tid in ticket_ids})
+        for tid, ok in results.items():
+            if ok:
+                logger.info("Ticket %s rescheduled to %s", tid, due_date)
+        return results
 
     def delete_ticket(self, ticket_id: str) -> bool:
-        def fn(t, lines, i):
-            # сначала мета (i+1), потом задачу (i)
-            if i + 1 < len(lines) and self._RE_META.search(lines[i + 1]):
-                lines.pop(i + 1)
-            lines.pop(i)
+        return self.delete_tickets([ticket_id])[ticket_id]
+
+    def delete_tickets(self, ticket_ids: Iterable[str]) -> Dict[str, bool]:
+        fn = self._delete_edit()
+        results = self._mutate_many({tid: fn for tid in ticket_ids})
+        for tid, ok in results.items():
+            if ok:
+                logger.info("Deleted ticket %s", tid)
+        return results
+
+    # ── Архив ──
+
+    @staticmethod
+    def _file_day(fp: Path) -> Optional[str]:
+        try:
+            return date.fromisoformat(fp.stem).isoformat()
+        except ValueError:
+            return None
+
+    def _is_archivable(self, t: Ticket, fp: Path, cutoff: str) -> bool:
+        closed = t.done_date or self._file_day(fp)
+        return t.status == "done" and closed is not None and closed < cutoff
+
+    def archive_candidates(self, older_than_days: int) -> List[Path]:
+        """Дневные файлы, в которых есть тикеты, закрытые раньше older_than_days дней назад."""
+        cutoff = (date.today() - timedelta(days=older_than_days)).isoformat()
+        with self._lock:
+            self._refresh(force=True)
+            return sorted(
+                fp
+                for fp, done in self._index.file_tickets("done").items()
+                if any(self._is_archivable(t, fp, cutoff) for t in done)
+            )
+
+    def archive_file(self, fp: Path, older_than_days: int) -> int:
+        """
+        Переносит старые закрытые тикеты из дневного файла в месячные заметки архива.
+        Строки задачи и меты копируются как есть. Сначала дописываем в архив, потом
+        переписываем исходный файл: при падении посередине тикет задублируется,
+        но не потеряется. Опустевший дневной файл удаляется.
+        """
+        cutoff = (date.today() - timedelta(days=older_than_days)).isoformat()
+        try:
+            lines = fp.read_text(encoding="utf-8").split("\n")
+        except FileNotFoundError:
+            return 0
+        tickets, positions = self._parse_lines(lines)
+        moving = [t for t in tickets if self._is_archivable(t, fp, cutoff)]
+        if not moving:
+            return 0
+
+        by_month: Dict[str, List[str]] = defaultdict(list)
+        for t in moving:
+            i = positions[t.id]
+            month = (self._file_day(fp) or t.done_date)[:7]
+            by_month[month] += lines[i : i + 2]
+
+        self.archive_path.mkdir(parents=True, exist_ok=True)
+        for month, rows in by_month.items():
+            self._append(self.archive_path / f"{month}.md", "\n".join(rows) + "\n")
+            self._touch(self.archive_path / f"{month}.md")
+
+        for i in sorted((positions[t.id] for t in moving), reverse=True):
+            del lines[i : i + 2]
+        if any(line.strip() for line in lines):
+            self._atomic_write(fp, "\n".join(lines))
+            self._index_lines(fp, lines)
+        else:
+            fp.unlink()
+            with self._lock:
+                self._index.drop_file(fp)
+        self._touch(fp)
 
-        ok = self._mutate(ticket_id, fn)
-        if ok:
-            logger.info("Deleted ticket %s", ticket_id)
-        return ok
+        logger.info("Archived %d ticket(s) from %s", len(moving), fp.name)
+        return len(moving)
+
+    def get_archived_tickets(self) -> List[Ticket]:
+        """Тикеты из архива, свежие месяцы первыми. Архив читается только по запросу."""
+        with self._lock:
+            seen = set()
+            for fp in self.archive_path.glob("*.md"):
+                try:
+                    st = fp.stat()
+                    entry = self._archive_files.get(fp)
+                    if not entry or (entry.mtime_ns, entry.size) != (
+                        st.st_mtime_ns,
+                        st.st_size,
+                    ):
+                        tickets, positions, newlines = self._parse_file(fp)
+                        self._archive_files[fp] = _FileEntry(
+                            st.st_mtime_ns, st.st_size, tickets, positions, newlines
+                        )
+                except FileNotFoundError:
+                    continue
+                seen.add(fp)
+            for fp in [fp for fp in self._archive_files if fp not in seen]:
+                del self._archive_files[fp]
+            return [
+                t
+                for fp in sorted(self._archive_files, reverse=True)
+                for t in self._archive_files[fp].tickets
+            ]
 
     def find_ticket(self, ticket_id: str) -> Optional[Ticket]:
-        return next((t for t in self._scan_all() if t.id == ticket_id), None)
+        with self._lock:
+            if self._locate(ticket_id) is None:
+                return None
+            return self._index.get(ticket_id)
+
+    def ticket_path(self, ticket_id: str) -> Optional[Path]:
+        """Дневной файл, в котором сейчас лежит тикет."""
+        loc = self._locate(ticket_id)
+        return loc[0] if loc else None
+
+    def ticket_paths(self, ticket_ids: Iterable[str]) -> Dict[str, Optional[Path]]:
+        return {
+            tid: loc[0] if loc else None
+            for tid, loc in self._locate_many(ticket_ids).items()
+        }
 
     @staticmethod
     def format_ticket_short(t: Ticket) -> str:
@@ -255,5 +1479,118 @@ class ObsidianVault:
             lines.append(f"🏷 Теги: {', '.join(t.tags)}")
         if t.description:
             lines.append(f"\n📝 {t.description}")
-        lines.append(f"\n🕐 Создан: {t.created[:16]}")
+        if t.created:
+            lines.append(f"\n🕐 Создан: {t.created[:16]}")
         return "\n".join(lines)
+
+
+class AsyncObsidianVault:
+    """
+    Асинхронный фасад над ObsidianVault для хендлеров.
+
+    Весь дисковый I/O уходит в отдельный пул потоков, чтобы не блокировать
+    event loop. Операции read-modify-write над одним дневным файлом
+    сериализуются через asyncio.Lock на файл.
+    """
+
+    format_ticket_short = staticmethod(ObsidianVault.format_ticket_short)
+    format_ticket_full = staticmethod(ObsidianVault.format_ticket_full)
+
+    def __init__(self, vault: ObsidianVault, max_workers: int = 4):
+        self.vault = vault
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="vault"
+        )
+        self._file_locks: Dict[Path, asyncio.Lock] = defaultdict(asyncio.Lock)
+
+    async def _run(self, fn: Callable, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, functools.partial(fn, *args, **kwargs)
+        )
+
+    async def _mutate(self, ticket_ids: List[str], fn: Callable, *args, **kwargs):
+        """Захватывает блокировки всех затронутых файлов (в фиксированном порядке)."""
+        paths = await self._run(self.vault.ticket_paths, ticket_ids)
+        async with contextlib.AsyncExitStack() as stack:
+            for fp in sorted({fp for fp in paths.values() if fp}):
+                await stack.enter_async_context(self._file_locks[fp])
+            return await self._run(fn, *args, **kwargs)
+
+    def take_dirty_paths(self) -> set:
+        return self.vault.take_dirty_paths()
+
+    # ── Чтение ──
+
+    async def get_all_tickets(self, status: Optional[str] = None) -> List[Ticket]:
+        return await self._run(self.vault.get_all_tickets, status)
+
+    async def get_active_tickets(self) -> List[Ticket]:
+        return await self._run(self.vault.get_active_tickets)
+
+    async def get_tickets_page(self, *args, **kwargs) -> Tuple[List[Ticket], int]:
+        return await self._run(self.vault.get_tickets_page, *args, **kwargs)
+
+    async def get_today_tickets(self) -> List[Ticket]:
+        return await self._run(self.vault.get_today_tickets)
+
+    async def get_overdue_tickets(self) -> List[Ticket]:
+        return await self._run(self.vault.get_overdue_tickets)
+
+    async def get_upcoming_tickets(self, days: int = 7) -> List[Ticket]:
+        return await self._run(self.vault.get_upcoming_tickets, days)
+
+    async def snapshot(self) -> TicketSnapshot:
+        return await self._run(self.vault.snapshot)
+
+    async def search_tickets(self, query: str) -> List[Ticket]:
+        return await self._run(self.vault.search_tickets, query)
+
+    async def find_ticket(self, ticket_id: str) -> Optional[Ticket]:
+        return await self._run(self.vault.find_ticket, ticket_id)
+
+    async def get_archived_tickets(self) -> List[Ticket]:
+        return await self._run(self.vault.get_archived_tickets)
+
+    # ── Запись ──
+
+    async def create_ticket(self, title: str, **kwargs) -> Ticket:
+        async with self._file_locks[self.vault._daily_path()]:
+            return await self._run(self.vault.create_ticket, title, **kwargs)
+
+    async def update_status(self, ticket_id: str, new_status: str) -> bool:
+        return await self._mutate(
+            [ticket_id], self.vault.update_status, ticket_id, new_status
+        )
+
+    async def update_statuses(
+        self, ticket_ids: List[str], new_status: str
+    ) -> Dict[str, bool]:
+        return await self._mutate(
+            ticket_ids, self.vault.update_statuses, ticket_ids, new_status
+        )
+
+    async def update_ticket(self, ticket_id: str, **kwargs) -> bool:
+        return await self._mutate(
+            [ticket_id], self.vault.update_ticket, ticket_id, **kwargs
+        )
+
+    async def reschedule_tickets(
+        self, ticket_ids: List[str], due_date: str
+    ) -> Dict[str, bool]:
+        return await self._mutate(
+            ticket_ids, self.vault.reschedule_tickets, ticket_ids, due_date
+        )
+
+    async def delete_ticket(self, ticket_id: str) -> bool:
+        return await self._mutate([ticket_id], self.vault.delete_ticket, ticket_id)
+
+    async def delete_tickets(self, ticket_ids: List[str]) -> Dict[str, bool]:
+        return await self._mutate(ticket_ids, self.vault.delete_tickets, ticket_ids)
+
+    async def archive_done(self, older_than_days: int) -> int:
+        moved = 0
+        for fp in await self._run(self.vault.archive_candidates, older_than_days):
+            async with self._file_locks[fp]:
+                moved += await self._run(self.vault.archive_file, fp, older_than_days)
+        return moved
@@ -1,84 +1,520 @@
+import asyncio
+import hashlib
+import json
 import logging
+import os
+import re
 import shutil
-import subprocess
+import tempfile
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime
 from pathlib import Path
-from typing import Tuple  # ← добавить
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
 
 logger = logging.getLogger(__name__)
 
+OnDone = Callable[[bool, str], Awaitable]
+
+
+@dataclass
+class MirrorStats:
+    scanned: int = 0  # файлов в vault
+    hashed: int = 0  # у скольких поменялись size/mtime и считался хэш
+    copied: int = 0
+    copied_bytes: int = 0
+    deleted: int = 0
+
+
+_RE_SUBMICRO = re.compile(r"(\.\d{6})\d+")
+
+
+def _rclone_mtime(value: str) -> float:
+    """ModTime из rclone lsjson (RFC 3339, наносекунды) → unix time."""
+    value = _RE_SUBMICRO.sub(r"\1", value).replace("Z", "+00:00")
+    return datetime.fromisoformat(value).timestamp()
+
+
+def _file_hash(fp: Path) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    with open(fp, "rb") as f:
+        while chunk := f.read(1 << 20):
+            h.update(chunk)
+    return h.hexdigest()
+
 
 class VaultSync:
-    def __init__(self, vault_path: str, icloud_path: str = "", rclone_remote: str = ""):
+    """
+    Синхронизация vault с iCloud: rclone bisync или прямое копирование.
+    Всё асинхронное — rclone идёт через asyncio-подпроцесс, копирование
+    в пуле потоков, так что event loop бота не блокируется.
+    """
+
+    TIMEOUT = 180
+
+    def __init__(
+        self,
+        vault_path: str,
+        icloud_path: str = "",
+        rclone_remote: str = "",
+        manifest_path: str = "",
+    ):
         self.vault_path = Path(vault_path)
         self.icloud_path = Path(icloud_path) if icloud_path else None
         self.rclone_remote = rclone_remote
+        # Манифест прямой синхронизации: что и в каком виде уже лежит в iCloud.
+        # Без manifest_path живёт только в памяти — после рестарта один полный проход.
+        self.manifest_path = Path(manifest_path) if manifest_path else None
+        self._manifest: Optional[Dict[str, list]] = None
+        # Начало последнего успешного bisync и mtime файлов, отправленных после
+        # него: по ним правки в удалённой копии отличаются от наших собственных
+        self._bisync_at: Optional[float] = None
+        self._pushed: Dict[str, float] = {}
 
     @property
     def is_configured(self) -> bool:
         return bool(self.icloud_path or self.rclone_remote)
 
-    def sync(self) -> Tuple[bool, str]:  # ← Tuple
+    async def sync(self, paths: Optional[Iterable[Path]] = None) -> Tuple[bool, str]:
+        """
+        paths=None — полная синхронизация. Иначе только перечисленные файлы
+        vault (записанные ботом): без обхода всего дерева на обеих сторонах.
+        """
+        rels = None if paths is None else self._relative(paths)
+        if rels is not None and not rels:
+            return True, "Изменений нет."
         if self.rclone_remote:
-            return self._sync_rclone()
+            if rels is not None:
+                return await self._push_rclone(rels)
+            return await self._sync_rclone()
         if self.icloud_path:
-            return self._sync_direct()
+            return await self._sync_direct(rels)
         return False, "Синхронизация не настроена."
 
-    def _sync_rclone(self) -> Tuple[bool, str]:  # ← Tuple
+    def _relative(self, paths: Iterable[Path]) -> Set[str]:
+        """Пути файлов относительно vault; чужие пути отбрасываются."""
+        root = self.vault_path.resolve()
+        rels = set()
+        for fp in paths:
+            try:
+                rels.add(Path(fp).resolve().relative_to(root).as_posix())
+            except ValueError:
+                logger.warning("Not a vault path, skipped: %s", fp)
+        return rels
+
+    async def _rclone(self, *args: str) -> Tuple[int, str]:
+        """rclone в подпроцессе. Возвращает код выхода и stderr."""
+        code, _, stderr = await self._rclone_output(*args)
+        return code, stderr
+
+    async def _rclone_output(self, *args: str) -> Tuple[int, str, str]:
+        """Как _rclone, но ещё и со stdout."""
+        proc = await asyncio.create_subprocess_exec(
+            "rclone",
+            *args,
+            "--verbose",
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
         try:
-            result = subprocess.run(
-                [
-                    "rclone",
-                    "bisync",
-                    str(self.vault_path),
-                    self.rclone_remote,
-                    "--verbose",
-                ],
-                capture_output=True,
-                text=True,
-                timeout=180,
+            stdout, stderr = await asyncio.wait_for(proc.communicate(), self.TIMEOUT)
+        finally:
+            # таймаут или отмена задачи — не оставляем rclone висеть
+            if proc.returncode is None:
+                proc.kill()
+                await proc.wait()
+        return (
+            proc.returncode,
+            stdout.decode(errors="replace"),
+            stderr.decode(errors="replace"),
+        )
+
+    async def _bisync(self, *extra: str) -> Tuple[int, str]:
+        return await self._rclone(
+            "bisync", str(self.vault_path), self.rclone_remote, *extra
+        )
+
+    async def _files_from(
+        self, cmd: str, *args: str, rels: Iterable[str]
+    ) -> Tuple[int, str, str]:
+        """rclone copy/delete/lsjson по списку файлов (--files-from-raw)."""
+        with tempfile.NamedTemporaryFile(
+            "w", encoding="utf-8", suffix=".txt", delete=False
+        ) as f:
+            f.write("".join(f"{rel}\n" for rel in sorted(rels)))
+        try:
+            return await self._rclone_output(cmd, *args, "--files-from-raw", f.name)
+        finally:
+            os.unlink(f.name)
+
+    async def _remote_edited(self, rels: Set[str]) -> bool:
+        """
+        Менялись ли эти файлы в удалённой копии после последнего bisync
+        (не нашей отправкой). Если не выяснить — считаем, что менялись.
+        """
+        if self._bisync_at is None:
+            return True
+        code, stdout, _ = await self._files_from(
+            "lsjson", self.rclone_remote, "--files-only", rels=rels
+        )
+        if code != 0:
+            return True
+        try:
+            remote = {
+                e["Path"]: _rclone_mtime(e["ModTime"]) for e in json.loads(stdout)
+            }
+        except (ValueError, KeyError, TypeError):
+            return True
+        for rel, mtime in remote.items():
+            pushed = self._pushed.get(rel)
+            if pushed is not None and abs(mtime - pushed) < 1:
+                continue  # отправили мы
+            # запас на расхождение часов: лишний bisync дешевле потерянной правки
+            if mtime > self._bisync_at - 2:
+                return True
+        return False
+
+    async def _push_rclone(self, rels: Set[str]) -> Tuple[bool, str]:
+        """
+        Односторонняя отправка файлов, записанных ботом. Если эти же файлы
+        правили в Obsidian/iCloud после последнего bisync, отправка затёрла бы
+        правку — тогда вместо неё полный bisync, он разрулит конфликт.
+        Прочие правки со стороны Obsidian забирает периодический полный bisync.
+        """
+        mtimes = {rel: st.st_mtime for rel, _, st in self._stat_files(rels)}
+        present = set(mtimes)
+        gone = rels - present
+        try:
+            if await self._remote_edited(rels):
+                logger.info("Remote files changed since last bisync, doing full sync")
+                return await self._sync_rclone()
+            if present:
+                code, _, stderr = await self._files_from(
+                    "copy", str(self.vault_path), self.rclone_remote, rels=present
+                )
+                if code != 0:
+                    return False, f"❌ Ошибка rclone:\n```\n{stderr[:500]}\n```"
+                self._pushed.update(mtimes)
+            if gone:
+                code, _, stderr = await self._files_from(
+                    "delete", self.rclone_remote, rels=gone
+                )
+                if code != 0:
+                    return False, f"❌ Ошибка rclone:\n```\n{stderr[:500]}\n```"
+                for rel in gone:
+                    self._pushed.pop(rel, None)
+            return True, (
+                f"✅ Отправлено через rclone: {len(present)} файл(ов), "
+                f"удалено {len(gone)}"
             )
-            if result.returncode == 0:
+        except FileNotFoundError:
+            return False, "❌ `rclone` не найден."
+        except asyncio.TimeoutError:
+            return False, f"❌ Таймаут ({self.TIMEOUT} сек)."
+        except Exception as e:
+            return False, f"❌ Ошибка: {e}"
+
+    def _bisync_done(self, started: float):
+        self._bisync_at, self._pushed = started, {}
+
+    async def _sync_rclone(self) -> Tuple[bool, str]:
+        started = time.time()
+        try:
+            code, stderr = await self._bisync()
+            if code == 0:
+                self._bisync_done(started)
                 return True, "✅ Синхронизация через rclone выполнена."
-            if "resync" in result.stderr:
-                return self._sync_rclone_resync()
-            return False, f"❌ Ошибка rclone:\n```\n{result.stderr[:500]}\n```"
+            if "resync" in stderr:
+                return await self._sync_rclone_resync()
+            return False, f"❌ Ошибка rclone:\n```\n{stderr[:500]}\n```"
         except FileNotFoundError:
             return False, "❌ `rclone` не найден."
-        except subprocess.TimeoutExpired:
-            return False, "❌ Таймаут (180 сек)."
+        except asyncio.TimeoutError:
+            return False, f"❌ Таймаут ({self.TIMEOUT} сек)."
         except Exception as e:
             return False, f"❌ Ошибка: {e}"
 
-    def _sync_rclone_resync(self) -> Tuple[bool, str]:  # ← Tuple
+    async def _sync_rclone_resync(self) -> Tuple[bool, str]:
+        started = time.time()
         try:
-            result = subprocess.run(
-                [
-                    "rclone",
-                    "bisync",
-                    str(self.vault_path),
-                    self.rclone_remote,
-                    "--resync",
-                    "--verbose",
-                ],
-                capture_output=True,
-                text=True,
-                timeout=180,
-            )
-            if result.returncode == 0:
+            code, stderr = await self._bisync("--resync")
+            if code == 0:
+                self._bisync_done(started)
                 return True, "✅ Первичная синхронизация выполнена."
-            return False, f"❌ Ошибка resync:\n```\n{result.stderr[:500]}\n```"
+            return False, f"❌ Ошибка resync:\n```\n{stderr[:500]}\n```"
+        except asyncio.TimeoutError:
+            return False, f"❌ Таймаут resync ({self.TIMEOUT} сек)."
         except Exception as e:
             return False, f"❌ Ошибка: {e}"
 
-    def _sync_direct(self) -> Tuple[bool, str]:  # ← Tuple
+    async def _sync_direct(self, rels: Optional[Set[str]] = None) -> Tuple[bool, str]:
         try:
             if not self.icloud_path:
                 return False, "iCloud path не задан."
-            self.icloud_path.mkdir(parents=True, exist_ok=True)
-            shutil.copytree(
-                str(self.vault_path), str(self.icloud_path), dirs_exist_ok=True
+            st = await asyncio.to_thread(self.mirror, rels)
+            return True, (
+                f"✅ Скопировано в iCloud: {st.copied} файл(ов), "
+                f"{st.copied_bytes / 1024:.1f} КБ, удалено {st.deleted}\n"
+                f"`{self.icloud_path}`"
             )
-            return True, f"✅ Скопировано в iCloud:\n`{self.icloud_path}`"
         except Exception as e:
             return False, f"❌ Ошибка: {e}"
+
+    # ── Прямая синхронизация по манифесту ──
+
+    def _load_manifest(self) -> Dict[str, list]:
+        """rel_path → [size, mtime_ns, hash] файлов, уже скопированных в iCloud."""
+        if self._manifest is not None:
+            return self._manifest
+        self._manifest = {}
+        if self.manifest_path and self.manifest_path.exists():
+            try:
+                data = json.loads(self.manifest_path.read_text(encoding="utf-8"))
+                # манифест от другой папки iCloud не годится — начинаем с нуля
+                if data.get("target") == str(self.icloud_path):
+                    self._manifest = data["files"]
+            except (ValueError, KeyError):
+                logger.warning("Sync manifest is corrupted, doing a full pass")
+        return self._manifest
+
+    def _save_manifest(self):
+        if not self.manifest_path:
+            return
+        self.manifest_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.manifest_path.with_suffix(".tmp")
+        data = {"target": str(self.icloud_path), "files": self._manifest}
+        tmp.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, self.manifest_path)
+
+    def _walk(self):
+        """(rel_path, path, stat) файлов vault, без временных файлов атомарной записи."""
+        for root, dirs, files in os.walk(self.vault_path):
+            dirs.sort()
+            for name in sorted(files):
+                if name.startswith(".") and name.endswith(".tmp"):
+                    continue
+                fp = Path(root) / name
+                try:
+                    st = fp.stat()
+                except FileNotFoundError:
+                    continue
+                yield fp.relative_to(self.vault_path).as_posix(), fp, st
+
+    def _copy_atomic(self, src: Path, dst: Path):
+        """Копия через временный файл рядом с dst и rename: iCloud не увидит половину файла."""
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        tmp = dst.with_name(f".{dst.name}.{uuid.uuid4().hex[:8]}.tmp")
+        try:
+            shutil.copy2(src, tmp)
+            os.replace(tmp, dst)
+        except BaseException:
+            tmp.unlink(missing_ok=True)
+            raise
+
+    def _stat_files(self, rels: Iterable[str]):
+        """Как _walk, но только по заданным путям; отсутствующие пропускаются."""
+        for rel in sorted(rels):
+            fp = self.vault_path / rel
+            try:
+                st = fp.stat()
+            except FileNotFoundError:
+                continue
+            yield rel, fp, st
+
+    def mirror(self, rels: Optional[Set[str]] = None) -> MirrorStats:
+        """
+        Односторонняя синхронизация vault → iCloud по манифесту.
+        Файлы с прежними size/mtime пропускаются без чтения, у изменённых
+        сверяется хэш, копируются только реально изменённые. Удалённые из
+        vault файлы удаляются и в iCloud — но только те, что копировали мы.
+        С rels смотрим только эти файлы, без обхода всего vault.
+        """
+        manifest = self._load_manifest()
+        stats = MirrorStats()
+        seen = set()
+        files = self._walk() if rels is None else self._stat_files(rels)
+        candidates = manifest if rels is None else rels & manifest.keys()
+        try:
+            for rel, fp, st in files:
+                stats.scanned += 1
+                seen.add(rel)
+                old = manifest.get(rel)
+                if old and old[0] == st.st_size and old[1] == st.st_mtime_ns:
+                    continue
+
+                stats.hashed += 1
+                digest = _file_hash(fp)
+                dst = self.icloud_path / rel
+                if not (old and old[2] == digest and dst.exists()):
+                    self._copy_atomic(fp, dst)
+                    stats.copied += 1
+                    stats.copied_bytes += st.st_size
+                manifest[rel] = [st.st_size, st.st_mtime_ns, digest]
+
+            for rel in [rel for rel in candidates if rel not in seen]:
+                dst = self.icloud_path / rel
+                dst.unlink(missing_ok=True)
+                del manifest[rel]
+                stats.deleted += 1
+                # опустевшие папки тоже убираем
+                for parent in dst.parents:
+                    if parent == self.icloud_path:
+                        break
+                    try:
+                        parent.rmdir()
+                    except OSError:
+                        break
+        finally:
+            # даже после ошибки посередине манифест описывает уже сделанное
+            if stats.hashed or stats.deleted:
+                self._save_manifest()
+        return stats
+
+
+class SyncScheduler:
+    """
+    Склеивает записи в vault в одну синхронизацию.
+
+    Каждая запись помечает vault грязным; синхронизация стартует, когда
+    записей не было quiet секунд, но не позже max_delay от первой
+    несинхронизированной записи. Синхронизирует единственная фоновая задача,
+    так что две синхронизации одновременно не идут: записи, пришедшие
+    во время синхронизации, уедут следующей.
+
+    Если запись сообщила изменённые файлы, синхронизируются только они;
+    запись без списка файлов и flush() дают полную синхронизацию.
+
+    Неудачная синхронизация повторяется сама с растущей паузой (от retry_min
+    до retry_max); ручной /sync повторяет сразу.
+    """
+
+    def __init__(
+        self,
+        sync: VaultSync,
+        quiet: float = 5.0,
+        max_delay: float = 60.0,
+        retry_min: float = 30.0,
+        retry_max: float = 600.0,
+    ):
+        self.sync = sync
+        self.quiet = quiet
+        self.max_delay = max_delay
+        self.retry_min = retry_min
+        self.retry_max = retry_max
+
+        self.pending = 0  # изменений с последней успешной синхронизации
+        self.running = False
+        self.last_sync_at: Optional[datetime] = None
+        self.last_result: Optional[Tuple[bool, str]] = None
+
+        self._first_dirty: Optional[float] = None
+        self._last_dirty = 0.0
+        self._flush = False  # ручной /sync — без ожидания тишины
+        self._paths: Set[Path] = set()  # файлы для точечной синхронизации
+        self._full = False  # нужна полная синхронизация
+        self._failures = 0  # неудачных синхронизаций подряд
+        self._retry_at = 0.0  # раньше этого не повторяем (кроме flush)
+        self._callbacks: List[OnDone] = []
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def mark_dirty(
+        self,
+        changes: int = 1,
+        paths: Optional[Iterable[Path]] = None,
+        on_done: Optional[OnDone] = None,
+    ):
+        """
+        Запись в vault. paths — затронутые файлы, None — неизвестно какие.
+        on_done(ok, msg) вызовется после синхронизации, которая её увезёт.
+        """
+        now = time.monotonic()
+        self.pending += changes
+        if paths is None:
+            self._full = True
+        else:
+            self._paths.update(paths)
+        self._first_dirty = self._first_dirty or now
+        self._last_dirty = now
+        self._schedule(on_done)
+
+    def flush(self, on_done: Optional[OnDone] = None):
+        """Полная синхронизация как можно скорее, даже без локальных изменений."""
+        self._flush = self._full = True
+        self._schedule(on_done)
+
+    def _schedule(self, on_done: Optional[OnDone]):
+        if on_done:
+            self._callbacks.append(on_done)
+        self._wakeup.set()
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._worker())
+
+    def _deadline(self) -> float:
+        if self._flush:
+            return 0.0
+        if self._first_dirty is None:
+            return self._retry_at
+        return max(
+            self._retry_at,
+            min(self._last_dirty + self.quiet, self._first_dirty + self.max_delay),
+        )
+
+    async def _worker(self):
+        while self.pending or self._flush:
+            # ждём тишины; новая запись будит и сдвигает срок
+            while (delay := self._deadline() - time.monotonic()) > 0:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+            ok, _ = await self._run()
+            if ok:
+                self._failures, self._retry_at = 0, 0.0
+            else:
+                # изменения вернулись в очередь — повторим после паузы;
+                # /sync, пришедший во время неудачной попытки, — сразу
+                self._failures += 1
+                delay = min(self.retry_min * 2 ** (self._failures - 1), self.retry_max)
+                self._retry_at = time.monotonic() + delay
+
+    async def _run(self) -> Tuple[bool, str]:
+        changes, callbacks = self.pending, self._callbacks
+        paths, full = self._paths, self._full
+        self.pending, self._callbacks = 0, []
+        self._paths, self._full = set(), False
+        self._first_dirty, self._flush = None, False
+
+        self.running = True
+        try:
+            ok, msg = await self.sync.sync(None if full else paths)
+        finally:
+            self.running = False
+        self.last_sync_at, self.last_result = datetime.now(), (ok, msg)
+        if ok:
+            logger.info("Vault sync finished (%d change(s))", changes)
+        else:
+            # изменения не уехали — остаются в очереди
+            self.pending += changes
+            self._paths |= paths
+            self._full = self._full or full
+            logger.warning("Vault sync failed: %s", msg)
+
+        for cb in callbacks:
+            try:
+                await cb(ok, msg)
+            except Exception:
+                logger.exception("Sync callback failed")
+        return ok, msg
+
+    def status(self) -> str:
+        if self.running:
+            state = "идёт синхронизация"
+        elif self.last_sync_at is None:
+            state = "ещё не синхронизировались"
+        else:
+            mark = "✅" if self.last_result[0] else "❌"
+            state = f"последняя {mark} {self.last_sync_at.strftime('%d.%m %H:%M:%S')}"
+        return f"{state} | изменений в очереди: {self.pending}"